@@ -1,8 +1,18 @@
 from .agent_template import (
     create_chat_agent,
+    create_chat_chain,
     create_llm,
     create_memory,
     create_judge_agent,
+    create_judge_chain,
+)
+from .memory import TokenBufferMemory
+from .judge_research import JudgeResearch
+from .session import (
+    SharedAgents,
+    SessionAgents,
+    create_shared_agents,
+    create_session_agents,
 )
 from . import nissa
 from . import judge
@@ -1,25 +1,28 @@
 # %%
 
 from langchain_openai import ChatOpenAI
-from langchain_core.utils.function_calling import convert_to_openai_function
-from langchain.agents.output_parsers import OpenAIFunctionsAgentOutputParser
-from langchain.agents.format_scratchpad import format_to_openai_functions
+from langchain.agents.output_parsers.openai_tools import OpenAIToolsAgentOutputParser
+from langchain.agents.format_scratchpad.openai_tools import (
+    format_to_openai_tool_messages,
+)
 from langchain.agents import AgentExecutor
 from langchain.tools import BaseTool
-from langchain.schema.runnable import RunnableLambda, RunnablePassthrough
+from langchain.schema.runnable import RunnablePassthrough
 from langchain.schema import SystemMessage
 from langchain.prompts import (
     ChatPromptTemplate,
     HumanMessagePromptTemplate,
     MessagesPlaceholder,
 )
-from langchain.memory import ConversationBufferMemory
 from langchain.memory.chat_memory import BaseMemory
 
 from dotenv import load_dotenv
 from functools import cache
+from typing import Optional
 import logging
 
+from .memory import TokenBufferMemory
+
 load_dotenv()
 
 
@@ -36,26 +39,31 @@ def create_llm(model_name: str = "gpt-4o"):
     return llm
 
 
-def create_memory():
-    memory = ConversationBufferMemory(
+def create_memory(
+    max_token_limit: int = 3000,
+    summary_token_limit: int = 500,
+    summary_model_name: Optional[str] = "gpt-4o-mini",
+):
+    memory = TokenBufferMemory(
         memory_key="history",
         input_key="human_input",
         output_key="output",
         return_messages=True,
-        max_token_limit=3000,
+        max_token_limit=max_token_limit,
+        summary_token_limit=summary_token_limit,
+        summary_model_name=summary_model_name,
     )
     memory.ai_prefix = "Nissa"
     return memory
 
 
-def create_chat_agent(
+def create_chat_chain(
     tools: list[BaseTool],
     system_message: str,
     prompt: str,
-    memory: BaseMemory,
     model_name: str = "gpt-4o",
 ):
-    """Create a Chat Agent with access to tools and chat history."""
+    """Create the agent chain of a Chat Agent, it holds no session state and can be shared."""
     llm = create_llm(model_name)
 
     prompt = ChatPromptTemplate.from_messages(
@@ -68,18 +76,36 @@ def create_chat_agent(
     )
 
     # setup chain
-    functions = [convert_to_openai_function(t) for t in tools]
-    llm_with_functions = llm.bind(functions=functions)
+    # the llm can call several tools per step, the executor runs them concurrently
+    llm_with_tools = llm.bind_tools(tools)
     agent_chain = (
         RunnablePassthrough.assign(
-            agent_scratchpad=lambda x: format_to_openai_functions(
+            agent_scratchpad=lambda x: format_to_openai_tool_messages(
                 x["intermediate_steps"]
             )
         )
         | prompt
-        | llm_with_functions
-        | OpenAIFunctionsAgentOutputParser()
+        | llm_with_tools
+        | OpenAIToolsAgentOutputParser()
     )
+    return agent_chain
+
+
+def create_chat_agent(
+    tools: list[BaseTool],
+    system_message: str,
+    prompt: str,
+    memory: BaseMemory,
+    model_name: str = "gpt-4o",
+    agent_chain=None,
+):
+    """Create a Chat Agent with access to tools and chat history.
+
+    A shared agent_chain from create_chat_chain is reused if it is given, then
+    only the executor with the session memory and tools is created.
+    """
+    if agent_chain is None:
+        agent_chain = create_chat_chain(tools, system_message, prompt, model_name)
 
     agent_executor = AgentExecutor(
         agent=agent_chain,
@@ -119,13 +145,13 @@ def parse(output):
 """
 
 
-def create_judge_agent(
+def create_judge_chain(
     tools: list[BaseTool],
     system_message: str,
     prompt: str,
-    memory: BaseMemory,
     model_name: str = "gpt-4o",
 ):
+    """Create the agent chain of the Judge, the chat history is passed as 'history' input."""
     llm = create_llm(model_name)
 
     prompt = ChatPromptTemplate.from_messages(
@@ -137,21 +163,30 @@ def create_judge_agent(
     )
 
     # setup chain
-    functions = [convert_to_openai_function(t) for t in tools]
-    llm_with_functions = llm.bind(functions=functions)
+    # the llm can call several tools per step, the executor runs them concurrently
+    llm_with_tools = llm.bind_tools(tools)
     agent_chain = (
         RunnablePassthrough.assign(
-            agent_scratchpad=lambda x: format_to_openai_functions(
+            agent_scratchpad=lambda x: format_to_openai_tool_messages(
                 x["intermediate_steps"]
             )
         )
-        | RunnablePassthrough.assign(
-            history=RunnableLambda(lambda x: memory.buffer_as_str)
-        )
         | prompt
-        | llm_with_functions
-        | OpenAIFunctionsAgentOutputParser()
+        | llm_with_tools
+        | OpenAIToolsAgentOutputParser()
     )
+    return agent_chain
+
+
+def create_judge_agent(
+    tools: list[BaseTool],
+    system_message: str,
+    prompt: str,
+    model_name: str = "gpt-4o",
+    agent_chain=None,
+):
+    if agent_chain is None:
+        agent_chain = create_judge_chain(tools, system_message, prompt, model_name)
 
     agent_executor = AgentExecutor(
         agent=agent_chain, tools=tools, verbose=False, handle_parsing_errors=True
@@ -0,0 +1,71 @@
+import json
+import time
+import tracemalloc
+from typing import Callable
+
+from mtg.utils import MTGBotConfig, load_config
+from mtg.utils.logging import get_logger
+
+from .session import SessionAgents, create_session_agents, create_shared_agents
+
+logger = get_logger(__name__)
+
+
+def _measure(create_session: Callable[[], SessionAgents], n_sessions: int) -> dict:
+    """mean latency and retained memory of creating n sessions"""
+    create_session()  # warm up imports and caches
+
+    latencies = []
+    for _ in range(n_sessions):
+        start = time.perf_counter()
+        create_session()
+        latencies.append(time.perf_counter() - start)
+
+    # memory is traced separately, tracing slows down the allocations
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    sessions = [create_session() for _ in range(n_sessions)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sessions
+
+    return {
+        "latency_ms": sum(latencies) / n_sessions * 1000,
+        "memory_kb": (after - before) / n_sessions / 1024,
+    }
+
+
+def benchmark_sessions(config: MTGBotConfig, n_sessions: int = 20) -> dict:
+    """compares building everything per session with sharing it per process"""
+    shared = create_shared_agents(config)
+    results = {
+        "per_session": _measure(
+            lambda: create_session_agents(create_shared_agents(config)), n_sessions
+        ),
+        "shared": _measure(lambda: create_session_agents(shared), n_sessions),
+    }
+    for metric in ("latency_ms", "memory_kb"):
+        results[f"{metric}_ratio"] = (
+            results["per_session"][metric] / results["shared"][metric]
+        )
+    logger.info(
+        f"new session: {results['shared']['latency_ms']:.1f} ms and "
+        f"{results['shared']['memory_kb']:.0f} kb with shared agents, "
+        f"{results['per_session']['latency_ms']:.1f} ms and "
+        f"{results['per_session']['memory_kb']:.0f} kb without"
+    )
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="measure new session latency and memory with and without shared agents"
+    )
+    parser.add_argument("--config", default="configs/config.yaml")
+    parser.add_argument("--sessions", type=int, default=20)
+    args = parser.parse_args()
+
+    results = benchmark_sessions(load_config(args.config), n_sessions=args.sessions)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,80 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from mtg.utils.logging import get_logger
+from mtg.utils.token_budget import TokenBudget
+
+logger = get_logger(__name__)
+
+IGNORED_TOOLS = frozenset(["user_deck_lookup", "judge_report"])
+
+
+@dataclass(slots=True)
+class Evidence:
+    tool: str
+    tool_input: dict[str, Any]
+    output: str
+    turn: int
+
+    def to_text(self) -> str:
+        arguments = ", ".join(
+            f"{name}={value!r}" for name, value in self.tool_input.items()
+        )
+        return f"{self.tool}({arguments}):\n{self.output}"
+
+
+class EvidenceStore:
+    """Tool inputs and outputs of the last turns of a session.
+
+    Nissa's tool calls and the judge research are recorded per turn, the
+    judge gets them as preloaded evidence instead of looking them up again.
+    A repeated call replaces the older one. Only the last max_turns turns
+    are kept, the text of the evidence is packed into the token budget with
+    the newest evidence first.
+    """
+
+    def __init__(self, max_turns: int = 2, token_budget: Optional[TokenBudget] = None):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.turn = 0
+        self._evidence: dict[tuple[str, str], Evidence] = {}
+
+    def __len__(self) -> int:
+        return len(self._evidence)
+
+    def start_turn(self):
+        self.turn += 1
+        self._evidence = {
+            key: evidence
+            for key, evidence in self._evidence.items()
+            if evidence.turn > self.turn - self.max_turns
+        }
+
+    def add(self, tool: str, tool_input: Any, output: Any):
+        if tool in IGNORED_TOOLS or not output:
+            return
+        if not isinstance(tool_input, dict):
+            tool_input = {"input": tool_input}
+        key = (tool, json.dumps(tool_input, sort_keys=True, default=str))
+        self._evidence.pop(key, None)
+        self._evidence[key] = Evidence(
+            tool=tool,
+            tool_input=tool_input,
+            output=str(getattr(output, "content", output)),
+            turn=self.turn,
+        )
+
+    def to_text(self) -> str:
+        records = [
+            [evidence.to_text()] for evidence in reversed(self._evidence.values())
+        ]
+        if self.token_budget is not None:
+            texts = self.token_budget.pack(records, name="evidence")
+        else:
+            texts = [variants[0] for variants in records]
+        logger.info(f"preloaded {len(texts)} of {len(records)} evidence records")
+        return "\n\n".join(texts)
+
+    def clear(self):
+        self._evidence = {}
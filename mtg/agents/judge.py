@@ -23,6 +23,10 @@ PROMPT = """
 <Chat History:> 
 {history}
 
+<Evidence:>
+Tool results that were already looked up in this conversation. Use them as sources and only search for what is missing.
+{evidence}
+
 <Task:>
 
 Address questions exclusively related to Magic: The Gathering. Utilize available tools to gather information before completing the report and answering questions.
@@ -56,11 +60,13 @@ async def astream_response(
     callback_handler: callable = None,
     trace_id: str = None,
     session_id: str = None,
+    history: str = "",
+    evidence: str = "",
 ):
     chunks = []
     with container("thinking...") as status:
         async for event in agent_executor.astream_events(
-            {},
+            {"history": history, "evidence": evidence or "Nothing was looked up yet."},
             version="v1",
             config={
                 "callbacks": [callback_handler],
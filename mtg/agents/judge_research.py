@@ -0,0 +1,83 @@
+import asyncio
+from concurrent.futures import Future
+from typing import Awaitable, Optional
+
+from langchain.tools import BaseTool
+from spacy.language import Language
+
+from mtg.tools import CardNamesSearchTool, RulesSearchTool
+from mtg.utils.dataservice_client import get_dataservice_client
+from mtg.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class JudgeResearch:
+    """Looks up the rules and cards of a question for the judge while nissa answers.
+
+    The question itself and every keyword in it (with a rules router) are
+    searched in the rules, the card names in it (with a card matcher) are
+    looked up with the card names tool. The lookups are started on the
+    dataservice client loop, the rules searches run in worker threads. They
+    fill the response cache; their results are handed to the judge as
+    evidence, so it only has to search for what is missing.
+    """
+
+    def __init__(
+        self,
+        card_names_tool: CardNamesSearchTool,
+        rules_tool: RulesSearchTool,
+        nlp: Optional[Language] = None,
+        max_keywords: int = 3,
+        max_cards: int = 10,
+    ):
+        self.card_names_tool = card_names_tool
+        self.rules_tool = rules_tool
+        self.nlp = nlp
+        self.max_keywords = max_keywords
+        self.max_cards = max_cards
+
+    def _match(self, query: str) -> tuple[list[str], list[str]]:
+        keywords = []
+        if self.rules_tool.rules_router is not None:
+            keywords = self.rules_tool.rules_router.match_keywords(query)
+        card_names = []
+        if self.nlp is not None:
+            card_names = self.nlp(query)._.card_names
+        return keywords[: self.max_keywords], card_names[: self.max_cards]
+
+    def _call(self, tool: BaseTool, tool_input: dict) -> Awaitable[str]:
+        if tool is self.rules_tool:
+            # the router and the local bm25 search are synchronous, they must not
+            # block the client loop that serves the requests of every session
+            return asyncio.to_thread(tool._run, **tool_input)
+        return tool._arun(**tool_input)
+
+    async def aresearch(self, query: str) -> list[tuple[str, dict, str]]:
+        """the rules and cards of the question as (tool, tool input, output)"""
+        keywords, card_names = await asyncio.to_thread(self._match, query)
+        logger.info(
+            f"judge research for '{query}' with keywords {keywords} "
+            f"and cards {card_names}"
+        )
+
+        calls = [(self.rules_tool, {"query": query})]
+        calls.extend((self.rules_tool, {"query": keyword}) for keyword in keywords)
+        if card_names:
+            calls.append((self.card_names_tool, {"card_names": card_names}))
+
+        results = await asyncio.gather(
+            *[self._call(tool, tool_input) for tool, tool_input in calls],
+            return_exceptions=True,
+        )
+        research = []
+        for (tool, tool_input), result in zip(calls, results):
+            if isinstance(result, BaseException):
+                logger.error(f"judge research {tool.name}{tool_input} failed: {result}")
+                continue
+            research.append((tool.name, tool_input, result))
+        return research
+
+    def research(self, query: str) -> Future:
+        """starts the research in the background and returns its future"""
+        return get_dataservice_client().submit(self.aresearch(query))
@@ -0,0 +1,206 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cache
+from typing import Any, Optional
+
+from langchain.memory import ConversationBufferMemory
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain.schema import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from pydantic import PrivateAttr
+
+from mtg.utils.logging import get_logger
+from mtg.utils.token_budget import get_encoding
+
+logger = get_logger(__name__)
+
+# tokens openai adds around every chat message
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+# a human message and the answer to it
+TURN_MESSAGES = 2
+
+
+@cache
+def get_summary_executor() -> ThreadPoolExecutor:
+    """process wide worker threads that summarize the memories of all sessions"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+
+class TokenBufferMemory(ConversationBufferMemory):
+    """Conversation memory with a hard token budget.
+
+    Tokens are counted once per message when it is saved. When the messages
+    exceed max_token_limit - summary_token_limit, the oldest turns are
+    removed from the buffer right away and folded into a rolling summary in
+    a background thread. The history of every turn is therefore bounded by
+    max_token_limit, the summary is cut to summary_token_limit tokens.
+
+    Without a summary_model_name the oldest turns are only dropped.
+    The latest turn is always kept, even if it is over the budget.
+    """
+
+    max_token_limit: int = 3000
+    summary_token_limit: int = 500
+    summary_model_name: Optional[str] = None
+    encoding_name: str = "o200k_base"
+    summary: str = ""
+
+    _token_counts: list[int] = PrivateAttr(default_factory=list)
+    _buffer_tokens: int = PrivateAttr(default=0)
+    _summary_tokens: int = PrivateAttr(default=0)
+    _pending: list[BaseMessage] = PrivateAttr(default_factory=list)
+    _summarizing: Optional[Future] = PrivateAttr(default=None)
+    _generation: int = PrivateAttr(default=0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def count(self, text: str) -> int:
+        return len(get_encoding(self.encoding_name).encode(text, disallowed_special=()))
+
+    def _count_message(self, message: BaseMessage) -> int:
+        return MESSAGE_OVERHEAD_TOKENS + self.count(self._buffer_as_str([message]))
+
+    @property
+    def buffer_tokens(self) -> int:
+        """tokens of the messages and the summary in the history"""
+        with self._lock:
+            return self._buffer_tokens + self._summary_tokens
+
+    @property
+    def buffer_as_messages(self) -> list[BaseMessage]:
+        with self._lock:
+            messages = list(self.chat_memory.messages)
+            summary = self.summary
+        if summary:
+            messages.insert(0, SystemMessage(content=SUMMARY_PREFIX + summary))
+        return messages
+
+    async def abuffer_as_messages(self) -> list[BaseMessage]:
+        return self.buffer_as_messages
+
+    @property
+    def buffer_as_str(self) -> str:
+        return self._buffer_as_str(self.buffer_as_messages)
+
+    async def abuffer_as_str(self) -> str:
+        return self.buffer_as_str
+
+    def save_context(self, inputs: dict[str, Any], outputs: dict[str, str]) -> None:
+        input_str, output_str = self._get_input_output(inputs, outputs)
+        messages = [HumanMessage(content=input_str), AIMessage(content=output_str)]
+        counts = [self._count_message(message) for message in messages]
+
+        with self._lock:
+            self.chat_memory.add_messages(messages)
+            self._token_counts.extend(counts)
+            self._buffer_tokens += sum(counts)
+            evicted = self._evict()
+            if evicted and self.summary_model_name is not None:
+                self._pending.extend(evicted)
+                if self._summarizing is None:
+                    self._summarizing = get_summary_executor().submit(
+                        self._summarize, self._generation
+                    )
+
+    async def asave_context(
+        self, inputs: dict[str, Any], outputs: dict[str, str]
+    ) -> None:
+        self.save_context(inputs, outputs)
+
+    def _evict(self) -> list[BaseMessage]:
+        """removes the oldest turns until the buffer is in its budget
+
+        Messages are saved in human/ai pairs and evicted as whole turns, the
+        history never starts with an answer and the summary gets both sides.
+        """
+        budget = self.max_token_limit - (
+            self.summary_token_limit if self.summary_model_name is not None else 0
+        )
+        messages = self.chat_memory.messages
+        n_evicted = 0
+        evicted_tokens = 0
+        while (
+            self._buffer_tokens - evicted_tokens > budget
+            and n_evicted < len(messages) - TURN_MESSAGES
+        ):
+            evicted_tokens += sum(
+                self._token_counts[n_evicted : n_evicted + TURN_MESSAGES]
+            )
+            n_evicted += TURN_MESSAGES
+        if not n_evicted:
+            return []
+
+        evicted = messages[:n_evicted]
+        self.chat_memory.messages = messages[n_evicted:]
+        self._token_counts = self._token_counts[n_evicted:]
+        self._buffer_tokens -= evicted_tokens
+        logger.info(
+            f"evicted {n_evicted // TURN_MESSAGES} turns with {evicted_tokens} tokens "
+            f"from memory, {self._buffer_tokens} tokens left"
+        )
+        return evicted
+
+    def _summarize(self, generation: int):
+        """folds the evicted messages into the summary until none are left"""
+        from .agent_template import create_llm
+
+        while True:
+            with self._lock:
+                if generation != self._generation or not self._pending:
+                    if generation == self._generation:
+                        self._summarizing = None
+                    return
+                pending, self._pending = self._pending, []
+                summary = self.summary
+
+            try:
+                new_summary = (
+                    create_llm(self.summary_model_name)
+                    .invoke(
+                        SUMMARY_PROMPT.format(
+                            summary=summary, new_lines=self._buffer_as_str(pending)
+                        )
+                    )
+                    .content
+                )
+            except Exception as e:
+                logger.error(f"could not summarize {len(pending)} messages: {e}")
+                with self._lock:
+                    if generation == self._generation:
+                        # retried with the next evicted messages
+                        self._pending = pending + self._pending
+                        self._summarizing = None
+                return
+
+            # the summary message with its prefix fits into summary_token_limit
+            limit = (
+                self.summary_token_limit
+                - MESSAGE_OVERHEAD_TOKENS
+                - self.count(SUMMARY_PREFIX)
+            )
+            encoding = get_encoding(self.encoding_name)
+            tokens = encoding.encode(new_summary, disallowed_special=())[:limit]
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self.summary = encoding.decode(tokens)
+                self._summary_tokens = MESSAGE_OVERHEAD_TOKENS + self.count(
+                    SUMMARY_PREFIX + self.summary
+                )
+            logger.info(
+                f"folded {len(pending)} messages into a summary of {len(tokens)} tokens"
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self.summary = ""
+            self._summary_tokens = 0
+            self._token_counts = []
+            self._buffer_tokens = 0
+            self._pending = []
+            self._summarizing = None
+            # a running summary of the old conversation is discarded
+            self._generation += 1
+
+    async def aclear(self) -> None:
+        self.clear()
@@ -2,6 +2,8 @@ from langchain.agents import AgentExecutor
 import streamlit as st
 from streamlit.delta_generator import DeltaGenerator
 
+from .evidence import EvidenceStore
+
 PROFILE_PICTURE = "./assets/favicon1.jpg"
 
 WELCOME_TEXT = """
@@ -31,7 +33,7 @@ A malicious intent is if the user wants to talk about:
     - other cardgames: Yu-Gi-Oh, Pokemon, Disney Arcana
 
 [deck building, card search]
-1. Lookup card names in the user query with the search_mtg_card_name tool.
+1. Lookup all card names in the user query at once with the search_mtg_card_names tool.
 2. Think about the main strategy for the deck and search for cards in that strategy. 
 3. Use the list_mtg_cards tool to get suggestions for possible cards in the deck. 
 4. Decide which of the received cards would be best for the user. Only answer with the best fitting cards.
@@ -41,7 +43,7 @@ A malicious intent is if the user wants to talk about:
 [rules question]
 For Rule advice questions:
 1. Lookup rules: Always use mtg_rules_search function for rule-related inquiries.
-2. Search cards: If the question involves specific cards, also use the search_mtg_card_name function to find relevant rulings.
+2. Search cards: If the question involves specific cards, also use the search_mtg_card_names function to find relevant rulings. Look up all cards in one call.
 3. Step-by-step analysis: Think step by step about how the received rules are relevant to the user question.
 4. Board state: Begin by describing the board state as you understand it.
 5. Short and precise answer: Provide a concise answer based on Magic: The Gathering rules.
@@ -51,7 +53,7 @@ PROMPT = """
 Remember:
 1. Do not answer questions unrelated to Magic the Gathering.
 2. If its a rules question lookup relevant rules with mtg_rules_search.
-3. Lookup all cards in the user question with mtg_card_search.
+3. Lookup all cards in the user question with one search_mtg_card_names call.
 3. Allways display card names like this: <<Card Name>>
 4. Under no circumstances can you answer questions regarding Yu-Gi-Oh, Pokemon or other trading card games.
 5. If the User Intent is malicious do not answer the question and tell the user in a friendly way your intended use is deck building and rule advice for Magic: the Gathering.
@@ -70,6 +72,7 @@ async def astream_response(
     session_id: str = None,
     decks: list[str] = [],
     callback_handler: callable = None,
+    evidence: EvidenceStore = None,
 ):
     if decks:
         decks_string = "\n".join(["- " + deck for deck in decks])
@@ -101,6 +104,12 @@ async def astream_response(
                 else:
                     st.write(f"using {event['name']}")
 
+            if kind == "on_tool_end" and evidence is not None:
+                evidence.add(
+                    event["name"],
+                    event["data"].get("input"),
+                    event["data"].get("output"),
+                )
             if kind == "on_chat_model_stream":
                 content = event["data"]["chunk"].content
                 if content:
@@ -0,0 +1,237 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from langchain.agents import AgentExecutor
+from langchain.memory.chat_memory import BaseMemory
+from langchain.tools import BaseTool
+from langchain_core.runnables import Runnable
+from spacy.language import Language
+
+from mtg.search import (
+    load_card_store,
+    load_card_index,
+    load_rules_index,
+    load_rules_router,
+)
+from mtg.tools import (
+    CardSearchTool,
+    CardNameSearchTool,
+    CardNamesSearchTool,
+    CardPrefetcher,
+    RulesSearchTool,
+    UserDeckLookupTool,
+    JudgeReportTool,
+)
+from mtg.utils import MTGBotConfig, get_token_budget
+from mtg.utils.config import LLMSettings
+
+from . import judge, nissa
+from .evidence import EvidenceStore
+from .judge_research import JudgeResearch
+from .agent_template import (
+    create_chat_agent,
+    create_chat_chain,
+    create_judge_agent,
+    create_judge_chain,
+    create_memory,
+)
+
+
+@dataclass
+class SharedAgents:
+    """Tools, function schemas, prompts and agent chains of one process.
+
+    None of them holds session state, they are shared by all sessions.
+    The deck tool is the only tool per session, its schema is the same for
+    every session so the shared chain is bound with a template instance.
+    """
+
+    nissa_tools: list[BaseTool]
+    judge_tools: list[BaseTool]
+    nissa_chain: Runnable
+    judge_chain: Runnable
+    llm_settings: LLMSettings
+    card_prefetcher: Optional[CardPrefetcher] = None
+    judge_research: Optional[JudgeResearch] = None
+
+
+@dataclass
+class SessionAgents:
+    """Everything a session owns: the memory, the uploaded decks, the tool
+    evidence of its last turns and the executors that combine them with the
+    shared chains."""
+
+    memory: BaseMemory
+    deck_tool: UserDeckLookupTool
+    agent: AgentExecutor
+    judge: AgentExecutor
+    evidence: EvidenceStore
+
+
+def create_tools(config: MTGBotConfig) -> dict[str, BaseTool]:
+    settings = config.dataservice_settings
+
+    card_store = None
+    card_index = None
+    if settings.card_store_path is not None:
+        card_store = load_card_store(settings.card_store_path)
+        if settings.card_search_mode != "remote":
+            card_index = load_card_index(
+                settings.card_store_path, settings.embedding_model
+            )
+
+    rules_index = None
+    rules_router = None
+    if settings.rules_index_path is not None:
+        rules_index = load_rules_index(settings.rules_index_path)
+        rules_router = load_rules_router(settings.rules_index_path)
+
+    card_token_budget = get_token_budget("cards", settings.card_search_token_budget)
+    rules_token_budget = get_token_budget("rules", settings.rules_search_token_budget)
+
+    card_search_tool = CardSearchTool(
+        url=settings.host,
+        threshold=settings.card_search_threshold,
+        number_of_cards=settings.card_search_number_of_cards,
+        card_index=card_index,
+        search_mode=settings.card_search_mode if card_index else "remote",
+        token_budget=card_token_budget,
+        streaming=settings.stream_search_responses,
+    )
+    card_name_search_tool = CardNameSearchTool(
+        url=settings.host,
+        card_store=card_store,
+        token_budget=card_token_budget,
+    )
+    card_names_search_tool = CardNamesSearchTool(
+        url=settings.host,
+        card_store=card_store,
+        token_budget=card_token_budget,
+    )
+    rules_search_tool = RulesSearchTool(
+        url=settings.host,
+        threshold=settings.rules_search_threshold,
+        token_budget=rules_token_budget,
+        streaming=settings.stream_search_responses,
+        rules_index=rules_index,
+        rules_router=rules_router,
+        reference_depth=settings.rules_reference_depth,
+        reference_token_budget=get_token_budget(
+            "rule_references", settings.rules_reference_token_budget
+        ),
+        search_mode=settings.rules_search_mode if rules_index else "remote",
+    )
+    return {
+        "card_search": card_search_tool,
+        "card_name_search": card_name_search_tool,
+        "card_names_search": card_names_search_tool,
+        "rules_search": rules_search_tool,
+        "judge_report": JudgeReportTool(),
+    }
+
+
+def load_card_nlp(config: MTGBotConfig) -> Optional[Language]:
+    """card name matcher of the card snapshot, None without a snapshot"""
+    card_snapshot_path = config.dataservice_settings.card_snapshot_path
+    if card_snapshot_path is None:
+        return None
+
+    from mtg.nlp.card_matcher import load_snapshot_spacy_model
+
+    return load_snapshot_spacy_model(
+        card_snapshot_path,
+        artifact_dir=config.dataservice_settings.card_matcher_artifact_dir,
+    )
+
+
+def create_card_prefetcher(
+    config: MTGBotConfig, card_name_search_tool: CardNameSearchTool
+) -> Optional[CardPrefetcher]:
+    nlp = load_card_nlp(config)
+    if not config.dataservice_settings.prefetch_card_names or nlp is None:
+        return None
+    return CardPrefetcher(card_name_search_tool, nlp)
+
+
+def create_judge_research(
+    config: MTGBotConfig, tools: dict[str, BaseTool]
+) -> Optional[JudgeResearch]:
+    if not config.llm_settings.pipeline_judge:
+        return None
+    return JudgeResearch(
+        card_names_tool=tools["card_names_search"],
+        rules_tool=tools["rules_search"],
+        nlp=load_card_nlp(config),
+    )
+
+
+def create_shared_agents(config: MTGBotConfig) -> SharedAgents:
+    """builds the tools and agent chains, once per process"""
+    tools = create_tools(config)
+    nissa_tools = [
+        tools["card_search"],
+        tools["card_name_search"],
+        tools["card_names_search"],
+        tools["rules_search"],
+    ]
+    judge_tools = [
+        tools["card_name_search"],
+        tools["rules_search"],
+        tools["judge_report"],
+    ]
+
+    return SharedAgents(
+        nissa_tools=nissa_tools,
+        judge_tools=judge_tools,
+        nissa_chain=create_chat_chain(
+            tools=[UserDeckLookupTool(), *nissa_tools],
+            system_message=nissa.SYSTEM_MESSAGE,
+            prompt=nissa.PROMPT,
+            model_name=config.llm_settings.nissa_llm_model_version,
+        ),
+        judge_chain=create_judge_chain(
+            tools=judge_tools,
+            system_message=judge.SYSTEM_MESSAGE,
+            prompt=judge.PROMPT,
+            model_name=config.llm_settings.judge_llm_model_version,
+        ),
+        llm_settings=config.llm_settings,
+        card_prefetcher=create_card_prefetcher(config, tools["card_name_search"]),
+        judge_research=create_judge_research(config, tools),
+    )
+
+
+def create_session_agents(shared: SharedAgents) -> SessionAgents:
+    """creates the memory, deck tool and executors of a new session"""
+    memory = create_memory(
+        max_token_limit=shared.llm_settings.memory_token_limit,
+        summary_token_limit=shared.llm_settings.memory_summary_token_limit,
+        summary_model_name=shared.llm_settings.memory_summary_llm_model_version,
+    )
+    deck_tool = UserDeckLookupTool()
+    agent = create_chat_agent(
+        tools=[deck_tool, *shared.nissa_tools],
+        system_message=nissa.SYSTEM_MESSAGE,
+        prompt=nissa.PROMPT,
+        memory=memory,
+        agent_chain=shared.nissa_chain,
+    )
+    judge_agent = create_judge_agent(
+        tools=shared.judge_tools,
+        system_message=judge.SYSTEM_MESSAGE,
+        prompt=judge.PROMPT,
+        agent_chain=shared.judge_chain,
+    )
+    evidence = EvidenceStore(
+        max_turns=shared.llm_settings.judge_evidence_turns,
+        token_budget=get_token_budget(
+            "evidence", shared.llm_settings.judge_evidence_token_budget
+        ),
+    )
+    return SessionAgents(
+        memory=memory,
+        deck_tool=deck_tool,
+        agent=agent,
+        judge=judge_agent,
+        evidence=evidence,
+    )
@@ -0,0 +1,298 @@
+import math
+from collections import defaultdict
+
+from rapidfuzz import fuzz, process
+from spacy.tokens import Doc
+from spacy.vocab import Vocab
+
+MatchResult = tuple[str, int, int, int, str]
+
+
+def _char_bigrams(text: str) -> list[tuple[str, int]]:
+    """character bigrams of a text, repeated bigrams are numbered to form a set"""
+    seen = defaultdict(int)
+    grams = []
+    for i in range(len(text) - 1):
+        gram = text[i : i + 2]
+        grams.append((gram, seen[gram]))
+        seen[gram] += 1
+    return grams
+
+
+def _min_shared_bigrams(length: int, min_ratio: int) -> int:
+    """lower bound of bigrams two texts with this total length must share.
+
+    A QRatio >= min_ratio allows an indel distance d <= (1 - min_ratio) * length.
+    Every distance operation can break at most one pair of adjacent aligned
+    characters, so at least (length - d) / 2 - 1 - d bigrams are shared.
+    The bound grows with the length, so it holds for all longer patterns too.
+    """
+    distance = (1 - min_ratio / 100) * length
+    return max(math.ceil((length - distance) / 2 - 1 - distance), 0)
+
+
+class AutomatonMatcher:
+    """Card name matcher with the same results as the spaczz FuzzyMatcher.
+
+    Exact hits are found with an Aho-Corasick automaton over lowercased tokens.
+    Fuzzy hits are found with a character bigram index: for every window of the
+    doc, only patterns that share enough bigrams to reach min_r1 are compared.
+    All candidates are scored and optimized like spaczz does, so both matchers
+    return the same matches.
+    """
+
+    def __init__(
+        self,
+        vocab: Vocab,
+        min_r1: int = 80,
+        min_r2: int = 80,
+        thresh: int = 100,
+    ):
+        self.vocab = vocab
+        self.min_r1 = min_r1
+        self.min_r2 = min_r2
+        self.thresh = thresh
+
+        # patterns: (label, pattern text, lowercased text, number of tokens)
+        self._patterns: list[tuple[str, str, str, int]] = []
+        self._labels: dict[str, list[int]] = {}
+        self._removed: set[int] = set()
+
+        # exact automaton over lowercased tokens
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[list[int]] = [[]]
+        self._compiled = True
+
+        # fuzzy index: (number of tokens, bigram) -> pattern ids
+        self._postings: dict[tuple[int, tuple[str, int]], list[int]] = {}
+        # (number of tokens, text length) -> pattern ids, for texts too short to filter
+        self._lengths: dict[tuple[int, int], list[int]] = defaultdict(list)
+        self._token_lengths: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def __contains__(self, label: str) -> bool:
+        return label in self._labels
+
+    @property
+    def labels(self) -> tuple[str, ...]:
+        return tuple(self._labels)
+
+    @property
+    def removed_patterns(self) -> int:
+        """number of removed patterns that are still part of the index"""
+        return len(self._removed)
+
+    def add(self, label: str, patterns: list[Doc]):
+        """adds patterns for a label, same signature as the spaczz matchers"""
+        for pattern in patterns:
+            if not len(pattern):
+                continue
+            pattern_id = len(self._patterns)
+            self._labels.setdefault(label, []).append(pattern_id)
+            text = pattern.text
+            lower_text = text.lower()
+            self._patterns.append((label, text, lower_text, len(pattern)))
+
+            # exact automaton
+            state = 0
+            for token in pattern:
+                key = token.lower_
+                if key not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][key] = len(self._goto) - 1
+                state = self._goto[state][key]
+            self._output[state].append(pattern_id)
+            self._compiled = False
+
+            # fuzzy index
+            for gram in _char_bigrams(lower_text):
+                self._postings.setdefault((len(pattern), gram), []).append(pattern_id)
+            self._lengths[(len(pattern), len(lower_text))].append(pattern_id)
+            self._token_lengths.add(len(pattern))
+
+    def remove(self, label: str):
+        """removes a label and its patterns, same signature as the spaczz matchers"""
+        try:
+            pattern_ids = self._labels.pop(label)
+        except KeyError:
+            raise ValueError(
+                f"The label: '{label}' does not exist within the matcher rules."
+            )
+        # removed patterns stay in the index and are skipped while matching
+        self._removed.update(pattern_ids)
+
+    def _compile(self):
+        """computes the failure links of the automaton (breadth first)"""
+        queue = []
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+
+        for state in queue:
+            for key, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and key not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(key, 0)
+                self._fail[next_state] = fail if fail != next_state else 0
+
+        self._compiled = True
+
+    def _exact_candidates(self, doc: Doc) -> set[tuple[int, int]]:
+        """(pattern id, start) of all windows whose tokens equal a pattern"""
+        if not self._compiled:
+            self._compile()
+
+        candidates = set()
+        state = 0
+        for i, token in enumerate(doc):
+            key = token.lower_
+            while state and key not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(key, 0)
+
+            output_state = state
+            while output_state:
+                for pattern_id in self._output[output_state]:
+                    if pattern_id in self._removed:
+                        continue
+                    n_tokens = self._patterns[pattern_id][3]
+                    candidates.add((pattern_id, i + 1 - n_tokens))
+                output_state = self._fail[output_state]
+        return candidates
+
+    def _fuzzy_candidates(self, text: str, n_tokens: int) -> set[int]:
+        """patterns with n_tokens that could reach min_r1 against the text"""
+        length = len(text)
+        min_length = math.ceil(length * self.min_r1 / (200 - self.min_r1))
+        min_shared = _min_shared_bigrams(length + min_length, self.min_r1)
+
+        if min_shared <= 0:
+            # too short for the bigram filter, compare with all similar lengths
+            max_length = math.floor(length * (200 - self.min_r1) / self.min_r1)
+            candidates = set()
+            for pattern_length in range(max(min_length, 1), max_length + 1):
+                candidates.update(self._lengths.get((n_tokens, pattern_length), []))
+            return candidates
+
+        # prefix filter: a pattern sharing min_shared bigrams has to share one
+        # of the len(grams) - min_shared + 1 rarest bigrams of the text
+        grams = sorted(
+            _char_bigrams(text),
+            key=lambda gram: len(self._postings.get((n_tokens, gram), [])),
+        )
+        candidates = set()
+        for gram in grams[: len(grams) - min_shared + 1]:
+            candidates.update(self._postings.get((n_tokens, gram), []))
+        return candidates
+
+    def _compare(self, query: str, text: str, min_r: int) -> int:
+        return round(fuzz.QRatio(query, text, score_cutoff=min_r))
+
+    def _optimize(
+        self, doc: Doc, query: str, n_tokens: int, pos: int, ratio: int
+    ) -> tuple[int, int, int] | None:
+        """flexes the match boundaries like the spaczz phrase searcher"""
+        flex = n_tokens // 2
+        doc_len = len(doc)
+        p_l = bp_l = pos
+        p_r = bp_r = pos + n_tokens
+        r = ratio
+
+        if flex and not r >= self.thresh:
+            optim_r = r
+            for f in range(1, flex + 1):
+                windows = []
+                if p_l - f >= 0:
+                    windows.append((p_l - f, p_r))
+                if p_l + f < p_r:
+                    windows.append((p_l + f, p_r))
+                if p_r - f > p_l:
+                    windows.append((p_l, p_r - f))
+                if p_r + f <= doc_len:
+                    windows.append((p_l, p_r + f))
+                if p_l - f >= 0 and p_r + f <= doc_len:
+                    windows.append((p_l - f, p_r + f))
+                if p_l + f < p_r and p_r - f > p_l:
+                    windows.append((p_l + f, p_r - f))
+
+                for start, end in windows:
+                    new_r = self._compare(
+                        query, doc[start:end].text.lower(), min_r=optim_r
+                    )
+                    if new_r:
+                        optim_r = new_r
+                        bp_l, bp_r = start, end
+
+                if optim_r == r:
+                    break
+                else:
+                    r = optim_r
+
+        if r >= self.min_r2:
+            return (bp_l, bp_r, r)
+        return None
+
+    def __call__(self, doc: Doc) -> list[MatchResult]:
+        """finds all matches in a doc, same format as the spaczz matchers"""
+        min_r1 = self.min_r1 if self.min_r1 else 1
+
+        # scan: pattern id -> start -> ratio
+        seeds: dict[int, dict[int, int]] = defaultdict(dict)
+        exact_starts: dict[int, set[int]] = defaultdict(set)
+        for pattern_id, start in self._exact_candidates(doc):
+            _, _, query, n_tokens = self._patterns[pattern_id]
+            ratio = self._compare(
+                query, doc[start : start + n_tokens].text.lower(), min_r1
+            )
+            if ratio:
+                seeds[pattern_id][start] = ratio
+                exact_starts[start].add(pattern_id)
+
+        for n_tokens in self._token_lengths:
+            for start in range(0, len(doc) - n_tokens + 1):
+                text = doc[start : start + n_tokens].text.lower()
+                candidates = list(
+                    self._fuzzy_candidates(text, n_tokens)
+                    - exact_starts[start]
+                    - self._removed
+                )
+                if not candidates:
+                    continue
+                # score all candidates of the window at once
+                results = process.extract(
+                    text,
+                    [self._patterns[pattern_id][2] for pattern_id in candidates],
+                    scorer=fuzz.QRatio,
+                    score_cutoff=min_r1,
+                    limit=None,
+                )
+                for _, ratio, idx in results:
+                    seeds[candidates[idx]][start] = round(ratio)
+
+        # optimize and filter overlapping matches per pattern
+        matches = set()
+        for pattern_id, match_values in seeds.items():
+            label, pattern_text, query, n_tokens = self._patterns[pattern_id]
+            pattern_matches = []
+            for pos in sorted(match_values):
+                match = self._optimize(doc, query, n_tokens, pos, match_values[pos])
+                if match:
+                    pattern_matches.append(match)
+
+            covered = set()
+            for start, end, ratio in sorted(
+                pattern_matches, key=lambda x: (-x[2], x[0])
+            ):
+                tokens = set(range(start, end))
+                if not tokens.intersection(covered):
+                    covered.update(tokens)
+                    matches.add((label, start, end, ratio, pattern_text))
+
+        return sorted(matches, key=lambda x: (-x[1], x[2] - x[1], x[3]), reverse=True)
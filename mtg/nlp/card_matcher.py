@@ -1,10 +1,23 @@
 # %%
+import hashlib
+import json
+import os
+import pickle
+import threading
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Literal, Optional
+
 import spacy
+import spaczz
 from spacy.language import Language
 from spaczz.matcher import FuzzyMatcher
 from spacy.tokens import Span, Doc
 from spacy.pipeline.functions import merge_entities
+from mtg.nlp.automaton_matcher import AutomatonMatcher
 from mtg.utils.logging import get_logger
+from mtg.utils.url_parsing import card_name_variants
 
 logger = get_logger(__name__)
 
@@ -32,29 +45,99 @@ BLOCK_LIST = [
 Doc.set_extension("card_names", default=[])
 
 
-def load_spacy_model(cards: list[str]):
-    """loads new spacy model"""
-    # load model
-    nlp = spacy.blank("en")
-    matcher = FuzzyMatcher(nlp.vocab, fuzzy_func="quick", min_r1=80, min_r2=80)
+MATCHER_ARTIFACT_VERSION = 1
+MATCHER_ARTIFACT_DIR = Path("data/models")
+
+MatcherBackend = Literal["spaczz", "automaton"]
+
+
+def create_matcher(nlp: Language, backend: MatcherBackend = "spaczz"):
+    """creates an empty card name matcher for the selected backend"""
+    if backend == "spaczz":
+        return FuzzyMatcher(nlp.vocab, fuzzy_func="quick", min_r1=80, min_r2=80)
+    if backend == "automaton":
+        return AutomatonMatcher(nlp.vocab, min_r1=80, min_r2=80)
+    raise ValueError(f"unknown matcher backend '{backend}'")
+
+
+def hash_card_names(cards: list[str], backend: MatcherBackend = "spaczz") -> str:
+    """hashes the card list together with everything that changes the artifact format"""
+    hasher = hashlib.sha256()
+    versions = [
+        MATCHER_ARTIFACT_VERSION,
+        backend,
+        spacy.__version__,
+        spaczz.__version__,
+    ]
+    hasher.update("|".join(map(str, versions)).encode())
+    for card_name in sorted(set(cards)):
+        hasher.update(b"\n" + card_name.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def card_name_patterns(
+    nlp: Language, card_name: str, doc: Doc = None, include_sides: bool = True
+) -> list[Doc]:
+    """patterns for a card: full name, short name before the comma and dfc sides"""
+    variants = card_name_variants(card_name, include_sides=include_sides)
+    card_docs = [doc if doc is not None else nlp(card_name)]
+    card_docs.extend(nlp.pipe(variants[1:]))
+    return card_docs
+
+
+def build_card_matcher(
+    nlp: Language, cards: list[str], backend: MatcherBackend = "spaczz"
+) -> FuzzyMatcher | AutomatonMatcher:
+    """adds all card names, short names and dfc sides to a new matcher"""
+    matcher = create_matcher(nlp, backend)
 
-    # set up matcher
     docs = nlp.pipe(cards)
     for doc, card_name in zip(docs, cards):
-        card_docs = [doc]
-        if "," in card_name:
-            short_name = card_name.split(",")[0]
-            short_name_doc = nlp(short_name)
-            card_docs.append(short_name_doc)
-        if "//" in card_name:
-            both_sides = card_name.split("//")
-            side_docs = nlp.pipe(both_sides)
-            card_docs.extend(side_docs)
-        matcher.add(card_name, card_docs)
-
-    @Language.component("card_name_matcher")
-    def matcher_component(doc):
-        matches = matcher(doc)
+        matcher.add(card_name, card_name_patterns(nlp, card_name, doc=doc))
+
+    return matcher
+
+
+# matchers shared by all pipelines of this process, forked workers inherit them
+_SHARED_MATCHERS: dict[str, FuzzyMatcher | AutomatonMatcher] = {}
+
+
+class CardNameMatcherComponent:
+    """spacy component that finds card names with a shared matcher.
+
+    The component only holds the key of the matcher, so sending the pipeline to
+    worker processes does not pickle the matcher. Workers that do not inherit
+    the matcher load it once from the precompiled artifact.
+    """
+
+    def __init__(
+        self, matcher_key: str, artifact_path: str = None, card_hash: str = None
+    ):
+        self.matcher_key = matcher_key
+        self.artifact_path = artifact_path
+        self.card_hash = card_hash
+
+    def __reduce__(self):
+        return (
+            CardNameMatcherComponent,
+            (self.matcher_key, self.artifact_path, self.card_hash),
+        )
+
+    @property
+    def matcher(self) -> FuzzyMatcher | AutomatonMatcher:
+        if self.matcher_key not in _SHARED_MATCHERS:
+            loaded = None
+            if self.artifact_path is not None:
+                loaded = load_card_matcher(self.artifact_path, self.card_hash)
+            if loaded is None:
+                raise RuntimeError(
+                    f"card matcher '{self.matcher_key}' is not available in this process"
+                )
+            _SHARED_MATCHERS[self.matcher_key] = loaded[1]
+        return _SHARED_MATCHERS[self.matcher_key]
+
+    def __call__(self, doc: Doc) -> Doc:
+        matches = self.matcher(doc)
         entities: list[Span] = []
         logger.info(f"matched {len(matches)} cards: {matches}")
         for card_name, start, end, ratio, pattern in matches:
@@ -66,39 +149,397 @@ def load_spacy_model(cards: list[str]):
         logger.info(f"added cards: {doc._.card_names}")
         return doc
 
-    nlp.add_pipe("card_name_matcher", last=True)
+
+@Language.factory(
+    "card_name_matcher",
+    default_config={"matcher_key": "", "artifact_path": None, "card_hash": None},
+)
+def create_card_name_matcher_component(
+    nlp: Language,
+    name: str,
+    matcher_key: str,
+    artifact_path: str | None,
+    card_hash: str | None,
+):
+    return CardNameMatcherComponent(matcher_key, artifact_path, card_hash)
+
+
+def add_card_name_matcher(
+    nlp: Language,
+    matcher: FuzzyMatcher | AutomatonMatcher,
+    card_hash: str,
+    artifact_path: Path = None,
+) -> Language:
+    """adds the card name matcher and entity merging to the pipeline.
+
+    The matcher is shared under the hash of its card list, loading the same
+    cards again replaces it instead of adding another matcher.
+    """
+    matcher_key = card_hash
+    _SHARED_MATCHERS[matcher_key] = matcher
+
+    config = {
+        "matcher_key": matcher_key,
+        "artifact_path": str(artifact_path) if artifact_path is not None else None,
+        "card_hash": card_hash,
+    }
+    nlp.add_pipe("card_name_matcher", last=True, config=config)
     nlp.add_pipe("merge_entities", last=True)
     return nlp
 
 
-def match_cards(text, cards):
+def load_spacy_model(cards: list[str], backend: MatcherBackend = "spaczz"):
+    """loads new spacy model"""
+    nlp = spacy.blank("en")
+    matcher = build_card_matcher(nlp, cards, backend=backend)
+    return add_card_name_matcher(
+        nlp, matcher, card_hash=hash_card_names(cards, backend=backend)
+    )
+
+
+def save_card_matcher(
+    nlp: Language,
+    matcher: FuzzyMatcher | AutomatonMatcher,
+    card_hash: str,
+    filepath: Path,
+) -> Path:
+    """serializes the blank pipeline and the compiled matcher to a versioned artifact.
+
+    The artifact starts with a json header line, so the hash can be checked
+    without unpickling the matcher.
+    """
+    filepath = Path(filepath)
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    header = {"version": MATCHER_ARTIFACT_VERSION, "card_hash": card_hash}
+
+    # write to a temporary file first so replicas never read half written artifacts
+    tmp_filepath = filepath.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_filepath.open("wb") as outfile:
+        outfile.write(json.dumps(header).encode("utf-8") + b"\n")
+        pickle.dump((nlp, matcher), outfile, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_filepath, filepath)
+
+    logger.info(f"saved card matcher artifact to {filepath}")
+    return filepath
+
+
+def load_card_matcher(
+    filepath: Path, card_hash: str
+) -> tuple[Language, FuzzyMatcher | AutomatonMatcher] | None:
+    """loads a matcher artifact, returns None if it is missing, unreadable or outdated"""
+    filepath = Path(filepath)
+    if not filepath.exists():
+        return None
+
+    try:
+        with filepath.open("rb") as infile:
+            try:
+                header = json.loads(infile.readline())
+            except ValueError:
+                logger.warning(f"could not read card matcher artifact {filepath}")
+                return None
+            if (header.get("version") != MATCHER_ARTIFACT_VERSION) or (
+                header.get("card_hash") != card_hash
+            ):
+                logger.info(f"card matcher artifact {filepath} is outdated")
+                return None
+            nlp, matcher = pickle.load(infile)
+    except OSError as e:
+        logger.warning(f"could not read card matcher artifact {filepath}: {e}")
+        return None
+
+    logger.info(f"loaded card matcher artifact from {filepath}")
+    return nlp, matcher
+
+
+def build_card_matcher_artifact(
+    cards: list[str],
+    artifact_dir: Path = MATCHER_ARTIFACT_DIR,
+    backend: MatcherBackend = "spaczz",
+) -> Path:
+    """build step: compiles the matcher for the card list and saves it"""
+    card_hash = hash_card_names(cards, backend=backend)
     nlp = spacy.blank("en")
-    matcher = FuzzyMatcher(nlp.vocab, fuzzy_func="quick", min_r1=80, min_r2=80)
-
-    # add cards to matcher
-    docs = nlp.pipe([card.name for card in cards])
-    for doc, card in zip(docs, cards):
-        card_docs = [doc]
-        if "," in card.name:
-            short_name = card.name.split(",")[0]
-            short_name_doc = nlp(short_name)
-            card_docs.append(short_name_doc)
-        matcher.add(card.name, card_docs)
-
-    # match cards
-    doc = nlp(text)
-    matches = matcher(doc)
-    entities: list[Span] = []
-    for card_name, start, end, ratio, pattern in matches:
-        if doc[start:end].text.lower() not in BLOCK_LIST:
-            entities.append(Span(doc, start, end, card_name))
-
-    doc._.card_names = list(set([entity.label_ for entity in entities]))
-    logger.info(f"matched {len(doc._.card_names)} cards: {doc._.card_names}")
-    doc.ents = list(spacy.util.filter_spans(entities))
-    doc = merge_entities(doc)
-    logger.debug(
-        f"adding {len(doc._.card_names)} cards to spacy doc: {doc._.card_names}"
+    matcher = build_card_matcher(nlp, cards, backend=backend)
+    return save_card_matcher(
+        nlp, matcher, card_hash, Path(artifact_dir) / f"card_matcher_{card_hash}.pkl"
     )
 
-    return doc
+
+def load_cached_spacy_model(
+    cards: list[str],
+    artifact_dir: Optional[Path] = MATCHER_ARTIFACT_DIR,
+    backend: MatcherBackend = "spaczz",
+) -> Language:
+    """loads the spacy model from the precompiled artifact.
+
+    The matcher is only rebuilt and saved again if the hash of the card list changed.
+    Without an artifact_dir, or if the artifact can not be written, the matcher
+    is only kept in memory.
+    """
+    if artifact_dir is None:
+        return load_spacy_model(cards, backend=backend)
+    card_hash = hash_card_names(cards, backend=backend)
+    filepath = Path(artifact_dir) / f"card_matcher_{card_hash}.pkl"
+
+    loaded = load_card_matcher(filepath, card_hash)
+    if loaded is None:
+        logger.info(f"building {backend} card matcher for {len(cards)} cards")
+        nlp = spacy.blank("en")
+        matcher = build_card_matcher(nlp, cards, backend=backend)
+        try:
+            save_card_matcher(nlp, matcher, card_hash, filepath)
+        except OSError as e:
+            logger.warning(f"could not save card matcher artifact {filepath}: {e}")
+            return add_card_name_matcher(nlp, matcher, card_hash=card_hash)
+    else:
+        nlp, matcher = loaded
+
+    return add_card_name_matcher(
+        nlp, matcher, artifact_path=filepath, card_hash=card_hash
+    )
+
+
+def snapshot_card_names(card_snapshot_path: str) -> list[str]:
+    """card names of a card snapshot, the ones with an url"""
+    from mtg.utils import load_card_url_index
+
+    return list(load_card_url_index(card_snapshot_path).card_urls)
+
+
+@cache
+def load_snapshot_spacy_model(
+    card_snapshot_path: str,
+    artifact_dir: Optional[Path] = MATCHER_ARTIFACT_DIR,
+    backend: MatcherBackend = "automaton",
+) -> Language:
+    """process wide pipeline matching the card names of a card snapshot"""
+    return load_cached_spacy_model(
+        snapshot_card_names(card_snapshot_path),
+        artifact_dir=artifact_dir,
+        backend=backend,
+    )
+
+
+def extract_card_names(
+    texts: Iterable[str] | Iterable[tuple[str, Any]],
+    nlp: Language,
+    batch_size: int = 64,
+    n_process: int = 1,
+) -> Iterator[tuple[Any, list[str], list[tuple[int, int, str]]]]:
+    """streams texts through the pipeline and yields the matched card names.
+
+    Texts can be plain strings, then the position is used as text id, or
+    (text, text_id) tuples. Yields (text_id, card_names, spans) with spans as
+    (start_char, end_char, card_name). Worker processes share the matcher of
+    the pipeline instead of receiving a pickled copy per batch.
+    """
+
+    def with_ids():
+        for idx, text in enumerate(texts):
+            if isinstance(text, str):
+                yield text, idx
+            else:
+                yield text
+
+    docs = nlp.pipe(
+        with_ids(), as_tuples=True, batch_size=batch_size, n_process=n_process
+    )
+    for doc, text_id in docs:
+        spans = [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+        yield text_id, doc._.card_names, spans
+
+
+def compare_matcher_backends(cards: list[str], texts: list[str]) -> list[dict]:
+    """matches the texts with both backends and returns all texts where they disagree"""
+    nlp = spacy.blank("en")
+    matchers = {
+        backend: build_card_matcher(nlp, cards, backend=backend)
+        for backend in ("spaczz", "automaton")
+    }
+
+    differences = []
+    for doc in nlp.pipe(texts):
+        matches = {
+            backend: sorted(matcher(doc)) for backend, matcher in matchers.items()
+        }
+        if matches["spaczz"] != matches["automaton"]:
+            differences.append({"text": doc.text, **matches})
+
+    logger.info(
+        f"compared matcher backends on {len(texts)} texts: {len(differences)} differences"
+    )
+    return differences
+
+
+class CardNameMatcher:
+    """Long lived card name matcher for match_cards.
+
+    The pipeline and matcher stay cached between calls. Card names are added
+    and removed incrementally when the card pool changes, the matcher is only
+    rebuilt if most of the pool changed.
+
+    Matches with the current card pool run concurrently. Changes of the pool
+    wait until the running matches are done and block new ones meanwhile.
+    """
+
+    def __init__(self, backend: MatcherBackend = "spaczz", rebuild_ratio: float = 0.5):
+        self.backend = backend
+        self.rebuild_ratio = rebuild_ratio
+        self.nlp = spacy.blank("en")
+        self.matcher = create_matcher(self.nlp, backend)
+        self.card_names: set[str] = set()
+        self.stats = {"calls": 0, "cache_hits": 0, "updates": 0, "rebuilds": 0}
+        self._condition = threading.Condition()
+        self._matching = 0
+        self._updating = False
+
+    @contextmanager
+    def _exclusive(self):
+        """holds off matches while the pool is changed"""
+        with self._condition:
+            self._condition.wait_for(lambda: not self._updating)
+            self._updating = True
+            try:
+                self._condition.wait_for(lambda: self._matching == 0)
+                yield
+            finally:
+                self._updating = False
+                self._condition.notify_all()
+
+    def add_cards(self, card_names: list[str]):
+        """adds new card names and their short names to the matcher"""
+        with self._exclusive():
+            self._add_cards(card_names)
+
+    def remove_cards(self, card_names: list[str]):
+        """removes card names from the matcher"""
+        with self._exclusive():
+            self._remove_cards(card_names)
+
+    def sync(self, card_names: list[str]):
+        """updates the matcher to exactly match the given card pool"""
+        with self._exclusive():
+            self._sync(card_names)
+
+    def _add_cards(self, card_names: list[str]):
+        new_card_names = [
+            card_name
+            for card_name in dict.fromkeys(card_names)
+            if card_name not in self.card_names
+        ]
+        docs = self.nlp.pipe(new_card_names)
+        for doc, card_name in zip(docs, new_card_names):
+            patterns = card_name_patterns(
+                self.nlp, card_name, doc=doc, include_sides=False
+            )
+            self.matcher.add(card_name, patterns)
+            self.card_names.add(card_name)
+
+    def _remove_cards(self, card_names: list[str]):
+        for card_name in set(card_names) & self.card_names:
+            self.matcher.remove(card_name)
+            self.card_names.remove(card_name)
+
+    def _rebuild(self, card_names: list[str]):
+        self.matcher = create_matcher(self.nlp, self.backend)
+        self.card_names = set()
+        self._add_cards(card_names)
+        self.stats["rebuilds"] += 1
+
+    def _sync(self, card_names: list[str]):
+        self.stats["calls"] += 1
+        requested = set(card_names)
+        added = requested - self.card_names
+        removed = self.card_names - requested
+
+        if not added and not removed:
+            self.stats["cache_hits"] += 1
+            return
+        changed = len(added) + len(removed)
+        removed_patterns = getattr(self.matcher, "removed_patterns", 0)
+        if (changed > self.rebuild_ratio * max(len(self.card_names), 1)) or (
+            removed_patterns > len(self.card_names)
+        ):
+            logger.debug(f"rebuilding card matcher for {len(requested)} cards")
+            self._rebuild(card_names)
+            return
+
+        logger.debug(f"updating card matcher: +{len(added)} -{len(removed)} cards")
+        self._remove_cards(list(removed))
+        self._add_cards([card_name for card_name in card_names if card_name in added])
+        self.stats["updates"] += 1
+
+    def match(self, text: str, card_names: list[str] = None) -> Doc:
+        """matches card names in the text, optionally syncing the card pool first"""
+        with self._condition:
+            self._condition.wait_for(lambda: not self._updating)
+            if card_names is not None and set(card_names) != self.card_names:
+                with self._exclusive():
+                    self._sync(card_names)
+            elif card_names is not None:
+                self._sync(card_names)
+            # counted before the lock is released, no update can come in between
+            self._matching += 1
+        try:
+            doc = self.nlp(text)
+            matches = self.matcher(doc)
+        finally:
+            with self._condition:
+                self._matching -= 1
+                self._condition.notify_all()
+
+        entities: list[Span] = []
+        for card_name, start, end, ratio, pattern in matches:
+            if doc[start:end].text.lower() not in BLOCK_LIST:
+                entities.append(Span(doc, start, end, card_name))
+
+        doc._.card_names = list(set([entity.label_ for entity in entities]))
+        logger.info(f"matched {len(doc._.card_names)} cards: {doc._.card_names}")
+        doc.ents = list(spacy.util.filter_spans(entities))
+        doc = merge_entities(doc)
+        logger.debug(
+            f"adding {len(doc._.card_names)} cards to spacy doc: {doc._.card_names}"
+        )
+
+        return doc
+
+
+@cache
+def get_card_name_matcher(backend: MatcherBackend = "spaczz") -> CardNameMatcher:
+    """process wide card name matcher used by match_cards"""
+    return CardNameMatcher(backend=backend)
+
+
+def match_cards(text, cards):
+    matcher = get_card_name_matcher()
+    return matcher.match(text, card_names=[card.name for card in cards])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="precompile the card name matcher from a json list of cards"
+    )
+    parser.add_argument("cards", type=Path, help="json file with cards or card names")
+    parser.add_argument("--artifact-dir", type=Path, default=MATCHER_ARTIFACT_DIR)
+    parser.add_argument("--backend", choices=["spaczz", "automaton"], default=None)
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="the cards are a card snapshot, build the matcher the app loads for it",
+    )
+    args = parser.parse_args()
+
+    if args.snapshot:
+        card_names = snapshot_card_names(args.cards)
+        backend = args.backend or "automaton"
+    else:
+        with args.cards.open("r", encoding="utf-8") as infile:
+            cards = json.load(infile)
+        card_names = [card if isinstance(card, str) else card["name"] for card in cards]
+        backend = args.backend or "spaczz"
+    build_card_matcher_artifact(
+        card_names, artifact_dir=args.artifact_dir, backend=backend
+    )
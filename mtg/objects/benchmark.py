@@ -0,0 +1,150 @@
+import json
+import timeit
+from pathlib import Path
+from typing import Callable, Optional
+
+from mtg.utils.logging import get_logger
+
+from .card import Card
+from .document import Document
+
+logger = get_logger(__name__)
+
+
+def sample_card_response(k: int = 20, n_rulings: int = 3) -> list[dict]:
+    """a /cards response with k cards, shaped like the dataservice results"""
+    return [
+        {
+            "card": {
+                "_id": f"card-{i}",
+                "name": f"Sample Card {i}",
+                "mana_cost": "{2}{G}{G}",
+                "type": "Creature — Elf Druid",
+                "oracle": "Deathtouch\nWhenever Sample Card dies, draw a card.",
+                "price": 1.25,
+                "url": f"https://scryfall.com/card/sample-{i}",
+                "power": "3",
+                "toughness": "3",
+                "color_identity": ["G"],
+                "keywords": ["Deathtouch"],
+                "rulings": [
+                    {
+                        "name": f"Sample Card {i}",
+                        "text": f"Ruling {j} about how deathtouch works with trample.",
+                        "url": f"https://scryfall.com/card/sample-{i}",
+                        "metadata": {"origin": "Rulings"},
+                    }
+                    for j in range(n_rulings)
+                ],
+                "legalities": {"standard": "legal", "modern": "legal"},
+            },
+            "distance": i / k,
+        }
+        for i in range(k)
+    ]
+
+
+def sample_rules_response(k: int = 20) -> list[dict]:
+    """a /rules response with k documents, shaped like the dataservice results"""
+    return [
+        {
+            "document": {
+                "name": f"702.2{chr(ord('a') + i % 26)}",
+                "text": "A creature with toughness greater than 0 that's been dealt "
+                "damage by a source with deathtouch is destroyed.",
+                "url": "https://media.wizards.com/comprehensive-rules.txt",
+                "metadata": {"origin": "Comprehensive Rules"},
+                "keywords": ["deathtouch"],
+            },
+            "distance": i / k,
+        }
+        for i in range(k)
+    ]
+
+
+def _validated_cards(response: list[dict]) -> list[Card]:
+    cards = []
+    for result in response:
+        card = Card(**result["card"])
+        logger.debug(f"received card {card.name} distance {result['distance']:.2f}")
+        cards.append(card)
+    return cards
+
+
+def _trusted_cards(response: list[dict]) -> list[Card]:
+    return [Card.from_trusted(result["card"]) for result in response]
+
+
+def _validated_documents(response: list[dict]) -> list[Document]:
+    documents = []
+    for result in response:
+        document = Document(**result["document"])
+        logger.debug(
+            f"received document {document.name} distance {result['distance']:.2f}"
+        )
+        documents.append(document)
+    return documents
+
+
+def _trusted_documents(response: list[dict]) -> list[Document]:
+    return [Document.from_trusted(result["document"]) for result in response]
+
+
+def benchmark_decoding(
+    card_response: Optional[list[dict]] = None,
+    rules_response: Optional[list[dict]] = None,
+    repeat: int = 200,
+) -> dict[str, dict[str, float]]:
+    """compares validated and trusted decoding, times are ms per response"""
+    card_response = card_response or sample_card_response()
+    rules_response = rules_response or sample_rules_response()
+
+    paths: dict[str, tuple[Callable, list[dict]]] = {
+        "cards_validated": (_validated_cards, card_response),
+        "cards_trusted": (_trusted_cards, card_response),
+        "rules_validated": (_validated_documents, rules_response),
+        "rules_trusted": (_trusted_documents, rules_response),
+    }
+
+    # both paths have to give the same objects
+    assert _validated_cards(card_response) == _trusted_cards(card_response)
+    assert _validated_documents(rules_response) == _trusted_documents(rules_response)
+
+    results = {}
+    for name, (decode, response) in paths.items():
+        seconds = min(timeit.repeat(lambda: decode(response), number=repeat, repeat=3))
+        results[name] = {"ms": seconds / repeat * 1000, "records": len(response)}
+
+    for kind in ("cards", "rules"):
+        speedup = results[f"{kind}_validated"]["ms"] / results[f"{kind}_trusted"]["ms"]
+        results[f"{kind}_speedup"] = speedup
+        logger.info(f"trusted decoding of {kind} is {speedup:.1f}x faster")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="benchmark validated and trusted decoding of search responses"
+    )
+    parser.add_argument(
+        "--cards", type=Path, help="json file with a /cards response", default=None
+    )
+    parser.add_argument(
+        "--rules", type=Path, help="json file with a /rules response", default=None
+    )
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    responses = {}
+    for kind in ("cards", "rules"):
+        filepath = getattr(args, kind)
+        if filepath is not None:
+            with filepath.open("r", encoding="utf-8") as infile:
+                responses[kind] = json.load(infile)
+
+    results = benchmark_decoding(
+        responses.get("cards"), responses.get("rules"), repeat=args.repeat
+    )
+    print(json.dumps(results, indent=2))
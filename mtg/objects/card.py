@@ -1,7 +1,7 @@
 from pathlib import Path
 from pydantic import BaseModel, Field
 from .document import Document
-
+from .trusted import construct_trusted
 
 MANACOST_MAPPER = {
     "W": "white",
@@ -31,13 +31,31 @@ class Card(BaseModel):
     def __repr__(self) -> str:
         return f"Card({self.name})"
 
+    @classmethod
+    def from_trusted(cls, data: dict) -> "Card":
+        """builds a card from dataservice data without validation"""
+        # private fields like _id are not set by validation either
+        values = {key: value for key, value in data.items() if not key.startswith("_")}
+        if values.get("rulings"):
+            values["rulings"] = [Document.from_trusted(r) for r in values["rulings"]]
+        return construct_trusted(
+            cls,
+            values,
+            defaults={
+                "color_identity": [],
+                "keywords": [],
+                "rulings": [],
+                "legalities": {},
+            },
+        )
+
     def to_dict(self) -> dict:
         return self.model_dump()
 
     def __hash__(self):
         return hash(self.name)
 
-    def to_text(self):
+    def to_text(self, include_rulings: bool = True, include_price: bool = True):
         """parse card data to text format"""
 
         # power
@@ -54,14 +72,20 @@ class Card(BaseModel):
         color_identity = " ".join(self.color_identity)
 
         # rulings
-        rulings = "\n".join([ruling.text for ruling in self.rulings])
+        rulings = ""
+        if include_rulings:
+            rulings = "\n".join([ruling.text for ruling in self.rulings])
+
+        price = ""
+        if include_price:
+            price = f"""
+        Price in EUR: {self.price}"""
 
         text = f"""
         {self.name}
         {mana_cost}
         Type: {self.type} {power_toughness}
-        Color Identity: {color_identity}
-        Price in EUR: {self.price}
+        Color Identity: {color_identity}{price}
 
         {self.oracle}
         """
@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field
 from typing import Union
 
+from .trusted import construct_trusted
+
 
 class Document(BaseModel):
     name: str  # text for display
@@ -14,5 +16,10 @@ class Document(BaseModel):
     def __repr__(self):
         return f"Document({self.name})"
 
+    @classmethod
+    def from_trusted(cls, data: dict) -> "Document":
+        """builds a document from dataservice data without validation"""
+        return construct_trusted(cls, data, defaults={"metadata": {}, "keywords": []})
+
     def to_dict(self):
         return self.model_dump()
@@ -12,7 +12,7 @@ class MessageType(Enum):
     ASSISTANT = "assistant"
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     text: str
     type: MessageType
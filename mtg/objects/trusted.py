@@ -0,0 +1,27 @@
+from functools import cache
+from typing import Any, TypeVar
+
+from pydantic import BaseModel
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+@cache
+def required_fields(model: type[BaseModel]) -> frozenset[str]:
+    return frozenset(
+        name for name, field in model.model_fields.items() if field.is_required()
+    )
+
+
+def construct_trusted(
+    model: type[Model], data: dict[str, Any], defaults: dict[str, Any]
+) -> Model:
+    """builds a model from dataservice data without validation.
+
+    The defaults of fields with default factories are passed in, model_construct
+    is slow with factories. Data with missing fields or None values is validated
+    instead, so it fails like untrusted data rather than later in the code.
+    """
+    if not required_fields(model) <= data.keys() or None in data.values():
+        return model(**data)
+    return model.model_construct(**{**defaults, **data})
@@ -0,0 +1,4 @@
+from .card_store import CardStore, load_card_store
+from .card_index import CardVectorIndex, load_card_index
+from .rules_index import RulesIndex, load_rules_index, reciprocal_rank_fusion
+from .rules_router import RulesRouter, load_rules_router
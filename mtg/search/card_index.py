@@ -0,0 +1,230 @@
+import json
+from functools import cache
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from mtg.search.card_store import CardStore
+from mtg.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+COLORS = ["W", "U", "B", "R", "G"]
+
+
+def _pack(mask: np.ndarray) -> np.ndarray:
+    return np.packbits(mask)
+
+
+class CardVectorIndex:
+    """Embedded semantic card search over the local card store.
+
+    Card embeddings are kept in one contiguous float32 matrix (memory mapped,
+    rows in the order of the card store, normalized to unit length). Color
+    identity, keywords and legalities are stored as packed bitsets, so filters
+    select candidates with a few bitwise operations before any vector is scored.
+
+    Distances are cosine distances and threshold is the maximum distance, like
+    the cosine space of the dataservice index.
+    """
+
+    def __init__(self, store: CardStore, embeddings: Embeddings):
+        self.store = store
+        self.embeddings = embeddings
+        self._matrix: Optional[np.ndarray] = None
+        self._filters: Optional[dict[str, np.ndarray]] = None
+        self._filter_names: Optional[dict[str, list[str]]] = None
+
+    @staticmethod
+    def build(store: CardStore, embeddings: np.ndarray):
+        """writes the embedding matrix and filter bitsets next to the card store"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(embeddings) != len(store):
+            raise ValueError(
+                f"got {len(embeddings)} embeddings for {len(store)} cards in the store"
+            )
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+        np.save(store.directory / "embeddings.npy", embeddings)
+
+        n_cards = len(store)
+        colors = {color: np.zeros(n_cards, dtype=bool) for color in COLORS}
+        keywords: dict[str, np.ndarray] = {}
+        legalities: dict[str, np.ndarray] = {}
+        for idx in range(n_cards):
+            record = store.record(idx)
+            for color in record.get("color_identity", []):
+                if color in colors:
+                    colors[color][idx] = True
+            for keyword in record.get("keywords", []):
+                keyword = keyword.lower()
+                if keyword not in keywords:
+                    keywords[keyword] = np.zeros(n_cards, dtype=bool)
+                keywords[keyword][idx] = True
+            for play_mode, legality in record.get("legalities", {}).items():
+                play_mode = play_mode.lower()
+                if play_mode not in legalities:
+                    legalities[play_mode] = np.zeros(n_cards, dtype=bool)
+                legalities[play_mode][idx] = legality == "legal"
+
+        filters = {}
+        names = {"colors": COLORS, "keywords": [], "legalities": []}
+        for color in COLORS:
+            filters[f"color_{color}"] = _pack(colors[color])
+        for i, (keyword, mask) in enumerate(keywords.items()):
+            filters[f"keyword_{i}"] = _pack(mask)
+            names["keywords"].append(keyword)
+        for i, (play_mode, mask) in enumerate(legalities.items()):
+            filters[f"legality_{i}"] = _pack(mask)
+            names["legalities"].append(play_mode)
+
+        np.savez(store.directory / "filters.npz", **filters)
+        with (store.directory / "filters.json").open("w", encoding="utf-8") as f:
+            json.dump(names, f)
+        logger.info(
+            f"built card vector index with {n_cards} cards, "
+            f"{len(keywords)} keywords and {len(legalities)} play modes"
+        )
+
+    def _open(self):
+        self._matrix = np.load(self.store.directory / "embeddings.npy", mmap_mode="r")
+        with (self.store.directory / "filters.json").open("r", encoding="utf-8") as f:
+            self._filter_names = json.load(f)
+        with np.load(self.store.directory / "filters.npz") as filters:
+            self._filters = {name: filters[name] for name in filters.files}
+
+    def _candidates(
+        self,
+        keywords: list[str],
+        color_identity: list[str],
+        legality: Optional[str],
+    ) -> Optional[np.ndarray]:
+        """ids of the cards that pass all filters, None if there are no filters"""
+        n_cards = len(self._matrix)
+        selected = None
+
+        def select(bits: np.ndarray):
+            nonlocal selected
+            selected = bits if selected is None else np.bitwise_and(selected, bits)
+
+        if color_identity:
+            # color identity has to be within the requested colors
+            for color in COLORS:
+                if color not in color_identity:
+                    select(np.invert(self._filters[f"color_{color}"]))
+
+        keyword_names = self._filter_names["keywords"]
+        for keyword in keywords:
+            keyword = keyword.lower()
+            if keyword not in keyword_names:
+                return np.array([], dtype=np.int64)
+            select(self._filters[f"keyword_{keyword_names.index(keyword)}"])
+
+        if legality:
+            play_modes = self._filter_names["legalities"]
+            legality = legality.lower()
+            if legality not in play_modes:
+                return np.array([], dtype=np.int64)
+            select(self._filters[f"legality_{play_modes.index(legality)}"])
+
+        if selected is None:
+            return None
+        return np.flatnonzero(np.unpackbits(selected, count=n_cards))
+
+    def _search(
+        self,
+        query_embedding: list[float],
+        k: int,
+        keywords: list[str],
+        color_identity: list[str],
+        legality: Optional[str],
+        threshold: float,
+    ) -> list[dict]:
+        if self._matrix is None:
+            self._open()
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+
+        candidates = self._candidates(keywords, color_identity, legality)
+        if candidates is None:
+            distances = 1 - self._matrix @ query
+            candidates = np.arange(len(distances))
+        elif len(candidates):
+            distances = 1 - self._matrix[candidates] @ query
+        else:
+            return []
+
+        # vectorized top k
+        if k < len(distances):
+            top = np.argpartition(distances, k)[:k]
+        else:
+            top = np.arange(len(distances))
+        top = top[np.argsort(distances[top])]
+
+        return [
+            {"card": self.store.record(int(candidates[i])), "distance": float(distance)}
+            for i, distance in zip(top, distances[top])
+            if distance <= threshold
+        ]
+
+    def search(
+        self,
+        query: str,
+        k: int = 20,
+        keywords: list[str] = [],
+        color_identity: list[str] = [],
+        legality: Optional[str] = None,
+        threshold: float = 0.5,
+    ) -> list[dict]:
+        """searches cards, results have the same shape as the dataservice /cards"""
+        query_embedding = self.embeddings.embed_query(query)
+        return self._search(
+            query_embedding, k, keywords, color_identity, legality, threshold
+        )
+
+    async def asearch(
+        self,
+        query: str,
+        k: int = 20,
+        keywords: list[str] = [],
+        color_identity: list[str] = [],
+        legality: Optional[str] = None,
+        threshold: float = 0.5,
+    ) -> list[dict]:
+        query_embedding = await self.embeddings.aembed_query(query)
+        return self._search(
+            query_embedding, k, keywords, color_identity, legality, threshold
+        )
+
+
+@cache
+def load_card_index(directory: Path, embedding_model: str) -> CardVectorIndex:
+    """process wide card vector index, opened lazily on the first search"""
+    from langchain_openai import OpenAIEmbeddings
+    from mtg.search.card_store import load_card_store
+
+    return CardVectorIndex(
+        load_card_store(directory), OpenAIEmbeddings(model=embedding_model)
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="build the card store and vector index from an export with embeddings"
+    )
+    parser.add_argument(
+        "cards", type=Path, help="json export, every card has 'embedding'"
+    )
+    parser.add_argument("directory", type=Path, help="output directory of the store")
+    args = parser.parse_args()
+
+    with args.cards.open("r", encoding="utf-8") as infile:
+        cards = json.load(infile)
+    cards = [card.get("card", card) for card in cards]
+    embeddings = [card.pop("embedding") for card in cards]
+    CardVectorIndex.build(CardStore.build(cards, args.directory), embeddings)
@@ -0,0 +1,172 @@
+import json
+import mmap
+import sys
+from functools import cache
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from mtg.objects import Card
+from mtg.utils.logging import get_logger
+from mtg.utils.url_parsing import card_name_keys, normalize_card_name
+
+logger = get_logger(__name__)
+
+CARD_STORE_VERSION = 2
+
+
+class CardStore:
+    """Compact on disk card store for card name lookups without the dataservice.
+
+    Layout of the store directory:
+        records.bin   json encoded card records, one after another
+        offsets.npy   start offset of every record, memory mapped
+        rulings.json  every distinct ruling once, records reference them by id
+        names.json    normalized names, short names and dfc sides -> record id
+
+    The files are opened on the first lookup. Records are decoded and turned
+    into Card objects only when they are accessed.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._records: Optional[mmap.mmap] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._rulings: Optional[list[dict]] = None
+        self._names: Optional[dict[str, int]] = None
+
+    @classmethod
+    def build(cls, cards: Iterable[dict], directory: Path) -> "CardStore":
+        """writes a store from card dicts in the shape of the Card object"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        ruling_ids: dict[str, int] = {}
+        rulings: list[dict] = []
+        names: dict[str, int] = {}
+        # short names and dfc sides never take the key of a full name
+        variant_names: dict[str, int] = {}
+        offsets = [0]
+
+        with (directory / "records.bin").open("wb") as outfile:
+            for idx, card in enumerate(cards):
+                if "card" in card:
+                    # dataservice export: {"card": {...}, "distance": ...}
+                    card = card["card"]
+                record = dict(card)
+
+                record_rulings = []
+                for ruling in card.get("rulings", []):
+                    key = json.dumps(ruling, sort_keys=True)
+                    if key not in ruling_ids:
+                        ruling_ids[key] = len(rulings)
+                        rulings.append(ruling)
+                    record_rulings.append(ruling_ids[key])
+                record["rulings"] = record_rulings
+
+                full_name, *variants = card_name_keys(card["name"])
+                names.setdefault(full_name, idx)
+                for name in variants:
+                    variant_names.setdefault(name, idx)
+
+                data = json.dumps(record, separators=(",", ":")).encode("utf-8")
+                outfile.write(data)
+                offsets.append(offsets[-1] + len(data))
+
+        names = {**variant_names, **names}
+        np.save(directory / "offsets.npy", np.array(offsets, dtype=np.int64))
+        with (directory / "rulings.json").open("w", encoding="utf-8") as outfile:
+            json.dump(rulings, outfile)
+        with (directory / "names.json").open("w", encoding="utf-8") as outfile:
+            json.dump({"version": CARD_STORE_VERSION, "names": names}, outfile)
+
+        logger.info(
+            f"built card store with {len(offsets) - 1} cards and {len(rulings)} rulings"
+        )
+        return cls(directory)
+
+    @classmethod
+    def from_json(cls, filepath: Path, directory: Path) -> "CardStore":
+        """builds the store from a json dump like tests/data/cards.json"""
+        with Path(filepath).open("r", encoding="utf-8") as infile:
+            cards = json.load(infile)
+        return cls.build(cards, directory)
+
+    def _open(self):
+        with (self.directory / "names.json").open("r", encoding="utf-8") as infile:
+            names = json.load(infile)
+        if names.get("version") != CARD_STORE_VERSION:
+            raise ValueError(f"card store {self.directory} has an outdated version")
+
+        self._offsets = np.load(self.directory / "offsets.npy", mmap_mode="r")
+        with (self.directory / "records.bin").open("rb") as infile:
+            if self._offsets[-1] > 0:
+                self._records = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._records = b""
+        self._names = names["names"]
+        logger.info(f"opened card store {self.directory} with {len(self)} cards")
+
+    @property
+    def rulings(self) -> list[dict]:
+        if self._rulings is None:
+            with (self.directory / "rulings.json").open("r", encoding="utf-8") as f:
+                rulings = json.load(f)
+            for ruling in rulings:
+                ruling["text"] = sys.intern(ruling["text"])
+            self._rulings = rulings
+        return self._rulings
+
+    def __len__(self) -> int:
+        if self._offsets is None:
+            self._open()
+        return len(self._offsets) - 1
+
+    def __contains__(self, card_name: str) -> bool:
+        return self.find(card_name) is not None
+
+    def find(self, card_name: str) -> Optional[int]:
+        """record id of a card name, short name or dfc side"""
+        if self._names is None:
+            self._open()
+        return self._names.get(normalize_card_name(card_name))
+
+    def record(self, idx: int) -> dict:
+        """decodes a card record with its rulings"""
+        if self._offsets is None:
+            self._open()
+        start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        record = json.loads(self._records[start:end])
+        rulings = self.rulings
+        record["rulings"] = [rulings[ruling_id] for ruling_id in record["rulings"]]
+        return record
+
+    def get_record(self, card_name: str) -> Optional[dict]:
+        idx = self.find(card_name)
+        if idx is None:
+            return None
+        return self.record(idx)
+
+    def get(self, card_name: str) -> Optional[Card]:
+        record = self.get_record(card_name)
+        if record is None:
+            return None
+        return Card(**record)
+
+
+@cache
+def load_card_store(directory: Path) -> CardStore:
+    """process wide card store, opened lazily on the first lookup"""
+    return CardStore(directory)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="build the local card store")
+    parser.add_argument("cards", type=Path, help="json dump of all cards")
+    parser.add_argument("directory", type=Path, help="output directory of the store")
+    args = parser.parse_args()
+
+    CardStore.from_json(args.cards, args.directory)
@@ -0,0 +1,229 @@
+import json
+import math
+import mmap
+import re
+from collections import Counter
+from functools import cache
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from mtg.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+RULES_INDEX_VERSION = 1
+
+# words and rule ids like 702.19b
+TOKEN_PATTERN = re.compile(r"\d+(?:\.\d+[a-z]?)?|[a-z]+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def document_key(document: dict) -> tuple[str, str]:
+    """identifies the same document in local and remote results"""
+    return document["name"], document["text"]
+
+
+def reciprocal_rank_fusion(
+    responses: list[list[dict]], k: int = 60, limit: Optional[int] = None
+) -> list[dict]:
+    """merges ranked rules search results, e.g. remote vector and local bm25 hits.
+
+    Every document scores 1 / (k + rank) in every result list it is part of.
+    The distance of the merged results is 1 - score / best possible score.
+    """
+    scores: dict[tuple[str, str], float] = {}
+    documents: dict[tuple[str, str], dict] = {}
+    for response in responses:
+        ranked = sorted(response, key=lambda result: result["distance"])
+        for rank, result in enumerate(ranked, start=1):
+            key = document_key(result["document"])
+            scores[key] = scores.get(key, 0.0) + 1 / (k + rank)
+            documents.setdefault(key, result["document"])
+
+    max_score = len(responses) / (k + 1)
+    merged = [
+        {"document": documents[key], "distance": 1 - score / max_score}
+        for key, score in sorted(scores.items(), key=lambda item: -item[1])
+    ]
+    return merged[:limit] if limit is not None else merged
+
+
+class RulesIndex:
+    """Embedded BM25 search over the rules corpus.
+
+    Layout of the index directory:
+        documents.bin    json encoded documents, one after another
+        doc_offsets.npy  start offset of every document
+        doc_lengths.npy  number of tokens of every document
+        postings.npy     document ids of all terms, grouped by term
+        frequencies.npy  term frequency of every posting
+        terms.json       term -> (first posting, number of postings), stats
+
+    The arrays are memory mapped when the index is opened, documents are only
+    decoded for the results of a search.
+    """
+
+    def __init__(self, directory: Path, k1: float = 1.5, b: float = 0.75):
+        self.directory = Path(directory)
+        self.k1 = k1
+        self.b = b
+        self._documents: Optional[mmap.mmap] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._lengths: Optional[np.ndarray] = None
+        self._postings: Optional[np.ndarray] = None
+        self._frequencies: Optional[np.ndarray] = None
+        self._terms: Optional[dict[str, list[int]]] = None
+        self._norms: Optional[np.ndarray] = None
+
+    @classmethod
+    def build(cls, documents: Iterable[dict], directory: Path) -> "RulesIndex":
+        """writes an index from documents in the shape of the Document object"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        term_postings: dict[str, list[tuple[int, int]]] = {}
+        offsets = [0]
+        lengths = []
+        with (directory / "documents.bin").open("wb") as outfile:
+            for idx, document in enumerate(documents):
+                if "document" in document:
+                    # dataservice export: {"document": {...}, "distance": ...}
+                    document = document["document"]
+                tokens = tokenize(f"{document['name']} {document['text']}")
+                lengths.append(len(tokens))
+                for term, frequency in Counter(tokens).items():
+                    term_postings.setdefault(term, []).append((idx, frequency))
+
+                data = json.dumps(document, separators=(",", ":")).encode("utf-8")
+                outfile.write(data)
+                offsets.append(offsets[-1] + len(data))
+
+        terms = {}
+        postings = []
+        frequencies = []
+        for term, entries in term_postings.items():
+            terms[term] = [len(postings), len(entries)]
+            postings.extend(idx for idx, _ in entries)
+            frequencies.extend(min(frequency, 255) for _, frequency in entries)
+
+        np.save(directory / "doc_offsets.npy", np.array(offsets, dtype=np.int64))
+        np.save(directory / "doc_lengths.npy", np.array(lengths, dtype=np.uint32))
+        np.save(directory / "postings.npy", np.array(postings, dtype=np.uint32))
+        np.save(directory / "frequencies.npy", np.array(frequencies, dtype=np.uint8))
+        with (directory / "terms.json").open("w", encoding="utf-8") as outfile:
+            json.dump(
+                {
+                    "version": RULES_INDEX_VERSION,
+                    "avg_length": float(np.mean(lengths)) if lengths else 0.0,
+                    "terms": terms,
+                },
+                outfile,
+            )
+
+        logger.info(
+            f"built rules index with {len(lengths)} documents and {len(terms)} terms"
+        )
+        return cls(directory)
+
+    @classmethod
+    def from_json(cls, filepath: Path, directory: Path) -> "RulesIndex":
+        """builds the index from a json export of the rules corpus"""
+        with Path(filepath).open("r", encoding="utf-8") as infile:
+            documents = json.load(infile)
+        return cls.build(documents, directory)
+
+    def _open(self):
+        with (self.directory / "terms.json").open("r", encoding="utf-8") as infile:
+            terms = json.load(infile)
+        if terms.get("version") != RULES_INDEX_VERSION:
+            raise ValueError(f"rules index {self.directory} has an outdated version")
+
+        self._offsets = np.load(self.directory / "doc_offsets.npy", mmap_mode="r")
+        self._lengths = np.load(self.directory / "doc_lengths.npy", mmap_mode="r")
+        self._postings = np.load(self.directory / "postings.npy", mmap_mode="r")
+        self._frequencies = np.load(self.directory / "frequencies.npy", mmap_mode="r")
+        with (self.directory / "documents.bin").open("rb") as infile:
+            if self._offsets[-1] > 0:
+                self._documents = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._documents = b""
+        self._terms = terms["terms"]
+        # length normalization of every document, the same for all queries
+        avg_length = max(terms["avg_length"], 1e-12)
+        self._norms = self.k1 * (1 - self.b + self.b * self._lengths / avg_length)
+        logger.info(f"opened rules index {self.directory} with {len(self)} documents")
+
+    def __len__(self) -> int:
+        if self._offsets is None:
+            self._open()
+        return len(self._offsets) - 1
+
+    def document(self, idx: int) -> dict:
+        if self._offsets is None:
+            self._open()
+        start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        return json.loads(self._documents[start:end])
+
+    def scores(self, query: str) -> np.ndarray:
+        """bm25 score of every document for the query"""
+        if self._offsets is None:
+            self._open()
+
+        n_docs = len(self)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        if not n_docs:
+            return scores
+        for term in set(tokenize(query)):
+            if term not in self._terms:
+                continue
+            start, count = self._terms[term]
+            ids = self._postings[start : start + count]
+            frequencies = self._frequencies[start : start + count].astype(np.float32)
+            idf = math.log(1 + (n_docs - count + 0.5) / (count + 0.5))
+            scores[ids] += (
+                idf * frequencies * (self.k1 + 1) / (frequencies + self._norms[ids])
+            )
+        return scores
+
+    def search(self, query: str, k: int = 10) -> list[dict]:
+        """searches rules, results have the same shape as the dataservice /rules"""
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        if k < len(hits):
+            hits = hits[np.argpartition(-scores[hits], k)[:k]]
+        hits = hits[np.argsort(-scores[hits])]
+
+        # bm25 scores are unbounded, map them to distances between 0 and 1
+        return [
+            {
+                "document": self.document(int(idx)),
+                "distance": 1 / (1 + float(scores[idx])),
+            }
+            for idx in hits
+        ]
+
+
+@cache
+def load_rules_index(directory: Path) -> RulesIndex:
+    """process wide rules index, opened lazily on the first search"""
+    return RulesIndex(directory)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="build the local bm25 rules index")
+    parser.add_argument("documents", type=Path, help="json export of the rules corpus")
+    parser.add_argument("directory", type=Path, help="output directory of the index")
+    args = parser.parse_args()
+
+    from mtg.search.rules_router import RulesRouter
+
+    RulesRouter.build(RulesIndex.from_json(args.documents, args.directory))
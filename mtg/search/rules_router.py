@@ -0,0 +1,228 @@
+import json
+import re
+from functools import cache
+from pathlib import Path
+from typing import Optional
+
+from mtg.search.rules_index import RulesIndex, load_rules_index
+from mtg.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+RULE_MAP_VERSION = 2
+
+RULE_ID = r"\d{3}\.\d+[a-z]?"
+RULE_ID_PATTERN = re.compile(rf"^{RULE_ID}$")
+RULE_RANGE_PATTERN = re.compile(
+    rf"^({RULE_ID})\s*(?:-|–|to)\s*({RULE_ID}|[a-z])$", re.IGNORECASE
+)
+# 702.19a Trample is a static ability.
+KEYWORD_RULE_PATTERN = re.compile(
+    r"^([A-Za-z][\w' -]{0,40}?) is an? (?:static|triggered|activated|spell|"
+    r"evasion|characteristic-defining)? ?(?:keyword )?(?:ability|action)",
+)
+QUERY_PREFIX_PATTERN = re.compile(
+    r"^(?:comprehensive rules?|cr|rules?|keyword(?: ability)?)\s+", re.IGNORECASE
+)
+# rule ids mentioned in a rule text, e.g. (See rule 510.1c.)
+RULE_REFERENCE_PATTERN = re.compile(rf"\b({RULE_ID})\b")
+QUERY_SPLIT_PATTERN = re.compile(r"\s*(?:,|;|\band\b)\s*", re.IGNORECASE)
+KEYWORD_SECTIONS = ("701.", "702.")
+
+
+def base_rule_id(rule_id: str) -> str:
+    """702.19b -> 702.19"""
+    return rule_id.rstrip("abcdefghijklmnopqrstuvwxyz")
+
+
+class RulesRouter:
+    """Answers exact rule lookups without a semantic search.
+
+    Rule ids (702.19b), whole rules with their subrules (702.19), ranges
+    (702.19a-d, 702.19a-702.19c) and keyword names (trample) are answered
+    from precomputed hash maps over the rules index. Every other query is
+    not routed and goes to the semantic search.
+
+    The rule map also holds the reference graph of the rulebook: for every
+    rule the rules its text refers to ("see rule 510.1c").
+
+    The maps are written to rule_map.json in the index directory when the
+    index is built, or built on first use from the indexed documents.
+    """
+
+    def __init__(self, index: RulesIndex, max_rules: int = 30):
+        self.index = index
+        self.max_rules = max_rules
+        self._rule_ids: Optional[dict[str, int]] = None
+        self._rule_sets: Optional[dict[str, list[str]]] = None
+        self._keywords: Optional[dict[str, str]] = None
+        self._order: Optional[list[str]] = None
+        self._references: Optional[dict[str, list[str]]] = None
+        self._keyword_pattern: Optional[re.Pattern] = None
+
+    @staticmethod
+    def build(index: RulesIndex) -> dict:
+        """writes the rule id, rule set and keyword maps of an index"""
+        rule_ids: dict[str, int] = {}
+        rule_sets: dict[str, list[str]] = {}
+        keywords: dict[str, str] = {}
+        texts: dict[str, str] = {}
+        for idx in range(len(index)):
+            document = index.document(idx)
+            rule_id = document["name"].strip().rstrip(".")
+            if not RULE_ID_PATTERN.match(rule_id) or rule_id in rule_ids:
+                continue
+            rule_ids[rule_id] = idx
+            texts[rule_id] = document["text"]
+            base = base_rule_id(rule_id)
+            rule_sets.setdefault(base, []).append(rule_id)
+
+            if not rule_id.startswith(KEYWORD_SECTIONS):
+                continue
+            text = document["text"].strip()
+            if rule_id == base and 0 < len(text.split()) <= 4 and text != "General":
+                # 702.19. Trample
+                keywords.setdefault(text.rstrip(".").lower(), base)
+            elif match := KEYWORD_RULE_PATTERN.match(text):
+                keywords.setdefault(match.group(1).lower(), base)
+
+        references: dict[str, list[str]] = {}
+        for rule_id, text in texts.items():
+            referenced = [
+                reference
+                for reference in RULE_REFERENCE_PATTERN.findall(text)
+                if reference in rule_ids and reference != rule_id
+            ]
+            if referenced:
+                references[rule_id] = list(dict.fromkeys(referenced))
+
+        rule_map = {
+            "version": RULE_MAP_VERSION,
+            "rule_ids": rule_ids,
+            "rule_sets": rule_sets,
+            "keywords": keywords,
+            "references": references,
+        }
+        with (index.directory / "rule_map.json").open("w", encoding="utf-8") as f:
+            json.dump(rule_map, f)
+        logger.info(
+            f"built rule map with {len(rule_ids)} rule ids, {len(keywords)} keywords "
+            f"and {sum(map(len, references.values()))} references"
+        )
+        return rule_map
+
+    def _open(self):
+        filepath = self.index.directory / "rule_map.json"
+        rule_map = None
+        if filepath.exists():
+            with filepath.open("r", encoding="utf-8") as infile:
+                rule_map = json.load(infile)
+        if rule_map is None or rule_map.get("version") != RULE_MAP_VERSION:
+            logger.warning(f"no rule map for {self.index.directory}, building it")
+            rule_map = self.build(self.index)
+
+        self._rule_ids = rule_map["rule_ids"]
+        self._rule_sets = rule_map["rule_sets"]
+        self._keywords = rule_map["keywords"]
+        self._references = rule_map["references"]
+        # rule ids in the order of the rulebook, for ranges
+        self._order = sorted(self._rule_ids, key=self._rule_ids.get)
+
+    def _expand(self, part: str) -> Optional[list[str]]:
+        """rule ids of one part of a query, None if it is not a rule reference"""
+        part = part.strip().rstrip(".").lower()
+        if RULE_ID_PATTERN.match(part):
+            if part in self._rule_sets:
+                # a whole rule with all its subrules
+                return self._rule_sets[part]
+            return [part] if part in self._rule_ids else []
+
+        if match := RULE_RANGE_PATTERN.match(part):
+            start, end = match.groups()
+            if len(end) == 1:
+                # 702.19a-d
+                end = base_rule_id(start) + end
+            if start not in self._rule_ids or end not in self._rule_ids:
+                return []
+            first, last = self._rule_ids[start], self._rule_ids[end]
+            return [
+                rule_id
+                for rule_id in self._order
+                if first <= self._rule_ids[rule_id] <= last
+            ]
+
+        if part in self._keywords:
+            return self._rule_sets.get(self._keywords[part], [])
+        return None
+
+    def route(self, query: str) -> Optional[list[dict]]:
+        """rules for rule ids, ranges and keywords, None for free text queries"""
+        if self._rule_ids is None:
+            self._open()
+
+        query = QUERY_PREFIX_PATTERN.sub("", query.strip())
+        rule_ids = []
+        for part in QUERY_SPLIT_PATTERN.split(query):
+            if not part:
+                continue
+            part_ids = self._expand(part)
+            if part_ids is None:
+                return None
+            rule_ids.extend(part_ids)
+
+        if not rule_ids:
+            return None
+        rule_ids = list(dict.fromkeys(rule_ids))[: self.max_rules]
+        logger.info(f"routed rules query '{query}' to {len(rule_ids)} rules")
+        return [
+            {"document": self.index.document(self._rule_ids[rule_id]), "distance": 0.0}
+            for rule_id in rule_ids
+        ]
+
+    def match_keywords(self, text: str) -> list[str]:
+        """keyword names mentioned in a text, e.g. a user question"""
+        if self._rule_ids is None:
+            self._open()
+        if not self._keywords:
+            return []
+        if self._keyword_pattern is None:
+            # longest names first, "double strike" before "strike"
+            keywords = sorted(self._keywords, key=len, reverse=True)
+            self._keyword_pattern = re.compile(
+                r"\b(" + "|".join(map(re.escape, keywords)) + r")\b"
+            )
+        return list(dict.fromkeys(self._keyword_pattern.findall(text.lower())))
+
+    def referenced_rules(self, rule_ids: list[str], depth: int = 1) -> list[str]:
+        """rules referenced by the given rules, breadth first up to depth hops"""
+        if self._rule_ids is None:
+            self._open()
+
+        seen = set(rule_ids)
+        referenced = []
+        frontier = list(rule_ids)
+        for _ in range(depth):
+            next_frontier = []
+            for rule_id in frontier:
+                for reference in self._references.get(rule_id, []):
+                    if reference not in seen:
+                        seen.add(reference)
+                        referenced.append(reference)
+                        next_frontier.append(reference)
+            frontier = next_frontier
+        return referenced
+
+    def get(self, rule_id: str) -> Optional[dict]:
+        """document of a single rule id"""
+        if self._rule_ids is None:
+            self._open()
+        idx = self._rule_ids.get(rule_id)
+        if idx is None:
+            return None
+        return self.index.document(idx)
+
+
+@cache
+def load_rules_router(directory: Path) -> RulesRouter:
+    """process wide router over the rules index in the directory"""
+    return RulesRouter(load_rules_index(directory))
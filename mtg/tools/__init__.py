@@ -1,5 +1,6 @@
-from .card_search_tool import CardSearchTool, CardNameSearchTool
+from .card_search_tool import CardSearchTool, CardNameSearchTool, CardNamesSearchTool
 from .rules_search_tool import RulesSearchTool
 from .deck_search_tool import UserDeckLookupTool
 from .call_judge_tool import CallJudgeTool
 from .judge_report_tool import JudgeReportTool
+from .card_prefetch import CardPrefetcher
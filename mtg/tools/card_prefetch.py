@@ -0,0 +1,85 @@
+import asyncio
+from concurrent.futures import Future
+
+from spacy.language import Language
+
+from mtg.tools.card_search_tool import CardNameSearchTool, send_get_request
+from mtg.utils.dataservice_client import get_dataservice_client
+from mtg.utils.logging import get_logger
+from mtg.utils.response_cache import get_response_cache
+
+logger = get_logger(__name__)
+
+PREFETCH_TAG = "card_prefetch"
+
+
+class CardPrefetcher:
+    """Looks up the cards named in a user query before the agent asks for them.
+
+    The card names are matched in the query and fetched on the dataservice
+    client loop while the first llm step runs. The responses go into the
+    response cache under the keys of the card name tools, so their lookups
+    return right away or join the request that is still in flight.
+
+    Prefetched keys are tagged in the cache, a hit is the first lookup of a
+    prefetched card by any tool.
+    """
+
+    def __init__(self, tool: CardNameSearchTool, nlp: Language, max_cards: int = 10):
+        self.tool = tool
+        self.nlp = nlp
+        self.max_cards = max_cards
+
+    def match(self, query: str) -> list[str]:
+        return self.nlp(query)._.card_names[: self.max_cards]
+
+    async def _fetch(self, card_name: str):
+        key = self.tool._card_name_cache_key(card_name)
+        try:
+            response = await send_get_request(
+                url=f"{self.tool.url}card_name/{card_name}", key=key
+            )
+        except Exception as e:
+            get_response_cache().untag(key)
+            logger.error(f"prefetch of card '{card_name}' failed: {e}")
+            return
+        get_response_cache().set(key, response)
+
+    async def aprefetch(self, query: str) -> list[str]:
+        """fetches the cards of the query that are neither cached nor local"""
+        card_names = await asyncio.to_thread(self.match, query)
+
+        cache = get_response_cache()
+        prefetched = []
+        for card_name in card_names:
+            if self.tool.card_store is not None and card_name in self.tool.card_store:
+                continue
+            key = self.tool._card_name_cache_key(card_name)
+            if key in cache:
+                continue
+            cache.tag(key, PREFETCH_TAG)
+            prefetched.append(card_name)
+
+        logger.info(
+            f"prefetching {len(prefetched)} of {len(card_names)} matched cards: "
+            f"{prefetched}"
+        )
+        await asyncio.gather(*[self._fetch(card_name) for card_name in prefetched])
+        return prefetched
+
+    def prefetch(self, query: str) -> Future:
+        """starts the prefetch in the background and returns its future"""
+        return get_dataservice_client().submit(self.aprefetch(query))
+
+    def stats(self) -> dict:
+        """prefetched cards and how many of them were looked up"""
+        stats = (
+            get_response_cache()
+            .stats()["tags"]
+            .get(PREFETCH_TAG, {"tagged": 0, "hits": 0})
+        )
+        return {
+            "prefetched": stats["tagged"],
+            "hits": stats["hits"],
+            "hit_rate": stats["hits"] / stats["tagged"] if stats["tagged"] else 0.0,
+        }
@@ -1,5 +1,6 @@
-import aiohttp
-import requests
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 from langchain.tools import BaseTool
 
 from pydantic import BaseModel, Field
@@ -11,23 +12,21 @@ from langchain.callbacks.manager import (
 )
 
 from mtg.objects import Card
+from mtg.search import CardStore, CardVectorIndex
+from mtg.utils.dataservice_client import get_dataservice_client
 from mtg.utils.logging import get_logger
+from mtg.utils.response_cache import get_response_cache, normalize_list, normalize_text
+from mtg.utils.token_budget import TokenBudget
 
 logger = get_logger(__name__)
 
 
-async def send_post_request(url, data):
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=data) as response:
-            response_json = await response.json()
-    return response_json
+async def send_post_request(url, data, key=None):
+    return await get_dataservice_client().post(url, data, key=key)
 
 
-async def send_get_request(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            response_json = await response.json()
-    return response_json
+async def send_get_request(url, key=None):
+    return await get_dataservice_client().get(url, key=key)
 
 
 class CardSearchInput(BaseModel):
@@ -63,6 +62,32 @@ class CardSearchTool(BaseTool):
     url: str = "http://localhost:8000/"
     threshold: float = 0.5
     number_of_cards: int = 20
+    use_cache: bool = True
+    card_index: Optional[CardVectorIndex] = None
+    search_mode: Literal["remote", "local", "local_with_remote_fallback"] = "remote"
+    token_budget: Optional[TokenBudget] = None
+    streaming: bool = False
+
+    def _cache_key(
+        self,
+        query: str,
+        keywords: list[str],
+        color_identity: list[str],
+        legality: Optional[str],
+    ) -> tuple:
+        return (
+            "cards",
+            self.url,
+            normalize_text(query),
+            normalize_list(keywords),
+            normalize_list(color_identity),
+            normalize_text(legality),
+            self.number_of_cards,
+            self.threshold,
+        )
+
+    def _card_name_cache_key(self, card_name: str) -> tuple:
+        return ("card_name", self.url, normalize_text(card_name))
 
     def _run(
         self,
@@ -82,18 +107,42 @@ class CardSearchTool(BaseTool):
             )
         )
 
-        response = requests.post(
-            url=f"{self.url}cards",
-            json={
-                "text": query,
-                "k": self.number_of_cards,
-                "keywords": keywords,
-                "color_identity": color_identity,
-                "legality": legality,
-                "threshold": self.threshold,
-            },
-        )
-        response = response.json()
+        if self.search_mode != "remote":
+            try:
+                response = self.card_index.search(
+                    query,
+                    k=self.number_of_cards,
+                    keywords=keywords,
+                    color_identity=color_identity,
+                    legality=legality,
+                    threshold=self.threshold,
+                )
+                return self._parse_response(response)
+            except Exception as e:
+                if self.search_mode == "local":
+                    raise
+                logger.error(f"local card search failed, asking dataservice: {e}")
+
+        payload = {
+            "text": query,
+            "k": self.number_of_cards,
+            "keywords": keywords,
+            "color_identity": color_identity,
+            "legality": legality,
+            "threshold": self.threshold,
+        }
+
+        key = self._cache_key(query, keywords, color_identity, legality)
+
+        def fetch():
+            return get_dataservice_client().post_sync(
+                f"{self.url}cards", payload, key=key
+            )
+
+        if self.use_cache:
+            response = get_response_cache().get_or_fetch(key, fetch)
+        else:
+            response = fetch()
         cards_text = self._parse_response(response)
         return cards_text
 
@@ -115,6 +164,22 @@ class CardSearchTool(BaseTool):
             )
         )
 
+        if self.search_mode != "remote":
+            try:
+                response = await self.card_index.asearch(
+                    query,
+                    k=self.number_of_cards,
+                    keywords=keywords,
+                    color_identity=color_identity,
+                    legality=legality,
+                    threshold=self.threshold,
+                )
+                return self._parse_response(response)
+            except Exception as e:
+                if self.search_mode == "local":
+                    raise
+                logger.error(f"local card search failed, asking dataservice: {e}")
+
         payload = {
             "text": query,
             "k": self.number_of_cards,
@@ -123,34 +188,92 @@ class CardSearchTool(BaseTool):
             "legality": legality,
             "threshold": self.threshold,
         }
-        response = await send_post_request(f"{self.url}cards", data=payload)
+
+        key = self._cache_key(query, keywords, color_identity, legality)
+
+        if self.streaming:
+            response = get_response_cache().get(key) if self.use_cache else None
+            if response is None:
+                return await self._astream_response(payload, key)
+            return self._parse_response(response)
+
+        def fetch():
+            return send_post_request(f"{self.url}cards", data=payload, key=key)
+
+        if self.use_cache:
+            response = await get_response_cache().aget_or_fetch(key, fetch)
+        else:
+            response = await fetch()
         cards_text = self._parse_response(response)
         return cards_text
 
+    def _card_texts(self, card: Card) -> list[str]:
+        """text variants of a card, from the most to the least detailed"""
+        if self.token_budget is None:
+            return [card.to_text()]
+        # rulings are dropped first, then the price
+        return list(
+            dict.fromkeys(
+                [
+                    card.to_text(),
+                    card.to_text(include_rulings=False),
+                    card.to_text(include_rulings=False, include_price=False),
+                ]
+            )
+        )
+
+    def _decode_result(self, result: dict) -> tuple[float, Card, list[str]]:
+        # the dataservice returns validated cards, skip validation
+        card = Card.from_trusted(result["card"])
+        return result["distance"], card, self._card_texts(card)
+
     def _parse_response(self, response: dict) -> list[Card]:
         """parses response to string and saves Cards in history"""
+        return self._format_results([self._decode_result(r) for r in response])
 
+    def _format_results(self, results: list[tuple[float, Card, list[str]]]) -> str:
         card_names = set()
         cards = []
-        for card in response:
-            card_data = card["card"]
-            distance = card["distance"]
-            card = Card(**card_data)
-            logger.debug(f"received card {card.name} distance {distance:.2f}")
+        texts = []
+        for _, card, card_texts in sorted(results, key=lambda result: result[0]):
             if card.name in card_names:
                 continue
             else:
                 cards.append(card)
+                texts.append(card_texts)
                 card_names.add(card.name)
 
         logger.info(
             f"received cards [{','.join([card.name for card in cards])}] from card search tool"
         )
-        cards_text = "\n\n".join([card.to_text() for card in cards])
+        if self.token_budget is None:
+            texts = [card_texts[0] for card_texts in texts]
+        else:
+            texts = self.token_budget.pack(texts, name=self.name)
+        cards_text = "\n\n".join(texts)
         if cards:
             return cards_text
         return "No Cards Info found!"
 
+    async def _astream_response(self, payload: dict, key: tuple) -> str:
+        """decodes the cards while the response is transferred, every complete
+        card also fills the cache of the card name search"""
+        response = []
+        results = []
+        async for result in get_dataservice_client().stream_post(
+            f"{self.url}cards", payload
+        ):
+            response.append(result)
+            results.append(self._decode_result(result))
+            if self.use_cache:
+                get_response_cache().set(
+                    self._card_name_cache_key(result["card"]["name"]),
+                    {"card": result["card"], "distance": 0.0},
+                )
+        if self.use_cache:
+            get_response_cache().set(key, response)
+        return self._format_results(results)
+
 
 class CardNameSearchInput(BaseModel):
     card_name: str = Field(description="The name of the card.")
@@ -163,6 +286,47 @@ class CardNameSearchTool(CardSearchTool):
         "Example: card_name = 'Black Lotus'"
     )
     args_schema: Type[BaseModel] = CardNameSearchInput
+    card_store: Optional[CardStore] = None
+
+    def _lookup_card_store(self, card_name: str) -> Optional[dict]:
+        """looks up the card in the local card store, None if it is not there"""
+        if self.card_store is None:
+            return None
+        record = self.card_store.get_record(card_name)
+        if record is None:
+            logger.info(f"card '{card_name}' not in card store, asking dataservice")
+            return None
+        return {"card": record, "distance": 0.0}
+
+    def _resolve(self, card_name: str) -> dict:
+        response = self._lookup_card_store(card_name)
+        if response is not None:
+            return response
+
+        key = self._card_name_cache_key(card_name)
+
+        def fetch():
+            return get_dataservice_client().get_sync(
+                f"{self.url}card_name/{card_name}", key=key
+            )
+
+        if self.use_cache:
+            return get_response_cache().get_or_fetch(key, fetch)
+        return fetch()
+
+    async def _aresolve(self, card_name: str) -> dict:
+        response = self._lookup_card_store(card_name)
+        if response is not None:
+            return response
+
+        key = self._card_name_cache_key(card_name)
+
+        def fetch():
+            return send_get_request(url=f"{self.url}card_name/{card_name}", key=key)
+
+        if self.use_cache:
+            return await get_response_cache().aget_or_fetch(key, fetch)
+        return await fetch()
 
     def _run(
         self,
@@ -173,8 +337,7 @@ class CardNameSearchTool(CardSearchTool):
 
         logger.info(f"Triggering Card Name Search with : '{card_name}' ")
 
-        response = requests.get(url=f"{self.url}card_name/{card_name}")
-        response = response.json()
+        response = self._resolve(card_name)
         cards_text = self._parse_response([response])
         return cards_text
 
@@ -186,6 +349,77 @@ class CardNameSearchTool(CardSearchTool):
         """Use the tool to search for a specific card asynchronous."""
         logger.info(f"Triggering Card Name Search with : '{card_name}' ")
 
-        response = await send_get_request(url=f"{self.url}card_name/{card_name}")
+        response = await self._aresolve(card_name)
         cards_text = self._parse_response([response])
         return cards_text
+
+
+class CardNamesSearchInput(BaseModel):
+    card_names: list[str] = Field(description="The names of all cards to look up.")
+
+
+class CardNamesSearchTool(CardNameSearchTool):
+    name: str = "search_mtg_card_names"
+    description: str = (
+        "Search for several specific magic the gathering cards in the card database at once. "
+        "Use it to look up all cards of a question in one step. "
+        "Example: card_names = ['Ambush Viper', 'Goblin Striker']"
+    )
+    args_schema: Type[BaseModel] = CardNamesSearchInput
+    max_workers: int = 8
+
+    def _unique_names(self, card_names: list[str]) -> list[str]:
+        unique_names = {}
+        for name in card_names:
+            unique_names.setdefault(normalize_text(name), name)
+        return list(unique_names.values())
+
+    def _combine(self, card_names: list[str], responses: list) -> str:
+        """parses all found cards, names that could not be resolved are listed"""
+        found = []
+        missing = []
+        for card_name, response in zip(card_names, responses):
+            if isinstance(response, BaseException):
+                logger.error(f"card name search for '{card_name}' failed: {response}")
+                missing.append(card_name)
+            else:
+                found.append(response)
+
+        cards_text = self._parse_response(found) if found else ""
+        if missing:
+            cards_text += f"\n\nNo Card Info found for: {', '.join(missing)}"
+        return cards_text.strip()
+
+    def _run(
+        self,
+        card_names: list[str],
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        """Use the tool to search for several cards."""
+        card_names = self._unique_names(card_names)
+        logger.info(f"Triggering Card Names Search with : {card_names}")
+
+        def resolve(card_name: str):
+            try:
+                return self._resolve(card_name)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            responses = list(executor.map(resolve, card_names))
+        return self._combine(card_names, responses)
+
+    async def _arun(
+        self,
+        card_names: list[str],
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+    ) -> str:
+        """Use the tool to search for several cards asynchronous."""
+        card_names = self._unique_names(card_names)
+        logger.info(f"Triggering Card Names Search with : {card_names}")
+
+        responses = await asyncio.gather(
+            *[self._aresolve(card_name) for card_name in card_names],
+            return_exceptions=True,
+        )
+        return self._combine(card_names, responses)
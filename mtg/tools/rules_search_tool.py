@@ -1,26 +1,26 @@
-import aiohttp
-import requests
 from langchain.tools import BaseTool
 
 from pydantic import BaseModel, Field
 
-from typing import Optional, Type
+from typing import Literal, Optional, Type
 from langchain.callbacks.manager import (
     AsyncCallbackManagerForToolRun,
     CallbackManagerForToolRun,
 )
 
 from mtg.objects import Document
+from mtg.search.rules_index import RulesIndex, reciprocal_rank_fusion
+from mtg.search.rules_router import RulesRouter
+from mtg.utils.dataservice_client import get_dataservice_client
 from mtg.utils.logging import get_logger
+from mtg.utils.response_cache import get_response_cache, normalize_text
+from mtg.utils.token_budget import TokenBudget
 
 logger = get_logger(__name__)
 
 
-async def send_post_request(url, data):
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=data) as response:
-            response_json = await response.json()
-            return response_json
+async def send_post_request(url, data, key=None):
+    return await get_dataservice_client().post(url, data, key=key)
 
 
 class RulesSearchInput(BaseModel):
@@ -35,14 +35,73 @@ class RulesSearchTool(BaseTool):
     url: str = "http://localhost:8000/"
     k: int = 10
     threshold: float = 0.4
+    use_cache: bool = True
+    token_budget: Optional[TokenBudget] = None
+    streaming: bool = False
+    rules_index: Optional[RulesIndex] = None
+    search_mode: Literal["remote", "local", "hybrid"] = "remote"
+    rules_router: Optional[RulesRouter] = None
+    reference_depth: int = 0
+    reference_token_budget: Optional[TokenBudget] = None
     description: str = """
     Lookup Magic the Gathering rules and information about various keywords from trustworthy sources:
         - Comprehensive Rulebook
         - Rulesguru.com
         - Stackexchange
         - Wikipedia.
+    Query with a rule id (702.19b), a range of rule ids (702.19a-d) or a keyword (trample) to get the exact rules.
     """
 
+    def _cache_key(self, query: str) -> tuple:
+        return ("rules", self.url, normalize_text(query), self.k, self.threshold)
+
+    def _fetch(self, query: str) -> list[dict]:
+        payload = {
+            "text": query,
+            "k": self.k,
+            "threshold": self.threshold,
+        }
+
+        key = self._cache_key(query)
+
+        def fetch():
+            return get_dataservice_client().post_sync(
+                f"{self.url}rules", payload, key=key
+            )
+
+        if self.use_cache:
+            return get_response_cache().get_or_fetch(key, fetch)
+        return fetch()
+
+    async def _afetch(self, query: str) -> list[dict]:
+        payload = {
+            "text": query,
+            "k": self.k,
+            "threshold": self.threshold,
+        }
+
+        key = self._cache_key(query)
+
+        def fetch():
+            return send_post_request(f"{self.url}rules", data=payload, key=key)
+
+        if self.use_cache:
+            return await get_response_cache().aget_or_fetch(key, fetch)
+        return await fetch()
+
+    def _route(self, query: str) -> Optional[list[dict]]:
+        """exact results for rule ids, ranges and keywords, None for free text"""
+        if self.rules_router is None:
+            return None
+        return self.rules_router.route(query)
+
+    def _merge_local(self, query: str, response: list[dict]) -> list[dict]:
+        """merges the remote results with the local bm25 results in hybrid mode"""
+        if self.search_mode != "hybrid":
+            return response
+        local_response = self.rules_index.search(query, k=self.k)
+        return reciprocal_rank_fusion([response, local_response], limit=self.k)
+
     def _run(
         self,
         query: str,
@@ -52,16 +111,21 @@ class RulesSearchTool(BaseTool):
 
         logger.info(f"Triggering Rules Search with query: {query}")
 
-        response = requests.post(
-            url=f"{self.url}rules",
-            json={
-                "text": query,
-                "k": self.k,
-                "threshold": self.threshold,
-            },
-        )
-        response = response.json()
-        return self._parse_response(response)
+        response = self._route(query)
+        if response is not None:
+            return self._parse_response(response)
+
+        if self.search_mode == "local":
+            return self._parse_response(self.rules_index.search(query, k=self.k))
+
+        try:
+            response = self._fetch(query)
+        except Exception as e:
+            if self.search_mode != "hybrid":
+                raise
+            logger.error(f"rules search failed, using the local rules index: {e}")
+            response = []
+        return self._parse_response(self._merge_local(query, response))
 
     async def _arun(
         self,
@@ -72,41 +136,101 @@ class RulesSearchTool(BaseTool):
 
         logger.info(f"Triggering Rules Search with query: {query}")
 
-        payload = {
-            "text": query,
-            "k": self.k,
-            "threshold": self.threshold,
-        }
-        response = await send_post_request(f"{self.url}rules", data=payload)
-        return self._parse_response(response)
+        response = self._route(query)
+        if response is not None:
+            return self._parse_response(response)
+
+        if self.search_mode == "local":
+            return self._parse_response(self.rules_index.search(query, k=self.k))
+
+        if self.streaming and self.search_mode == "remote":
+            key = self._cache_key(query)
+            response = get_response_cache().get(key) if self.use_cache else None
+            if response is None:
+                payload = {"text": query, "k": self.k, "threshold": self.threshold}
+                return await self._astream_response(payload, key)
+            return self._parse_response(response)
+
+        try:
+            response = await self._afetch(query)
+        except Exception as e:
+            if self.search_mode != "hybrid":
+                raise
+            logger.error(f"rules search failed, using the local rules index: {e}")
+            response = []
+        return self._parse_response(self._merge_local(query, response))
+
+    def _decode_result(self, result: dict) -> tuple[float, Document, str]:
+        # the dataservice returns validated documents, skip validation
+        doc = Document.from_trusted(result["document"])
+        text = f"{doc.name} - {doc.text}\nsource: {doc.url}"
+        return result["distance"], doc, text
 
     def _parse_response(self, response: dict) -> list[Document]:
         """parses response to string and saves documents in history"""
-        documents = []
-        for resp in response:
-            document = resp["document"]
-            distance = resp["distance"]
-            document = Document(**document)
-            documents.append(document)
-            logger.debug(f"received document {document.name} distance {distance:.2f}")
+        return self._format_results([self._decode_result(r) for r in response])
+
+    def _format_results(self, results: list[tuple[float, Document, str]]) -> str:
+        results = sorted(results, key=lambda result: result[0])
+        documents = [doc for _, doc, _ in results]
+        texts = [text for _, _, text in results]
 
         logger.info(f"received {len(documents)} documents from rules search tool")
 
+        if self.token_budget is not None:
+            texts = self.token_budget.pack([[text] for text in texts], name=self.name)
+        # the packed texts are a prefix of the sorted documents
+        n_packed = len(texts)
+
         origin_2_doc = {}
-        for doc in documents:
+        for doc, text in zip(documents, texts):
             origin = doc.metadata.get("origin", "other rules:")
             if origin not in origin_2_doc:
                 origin_2_doc[origin] = []
-            text = f"{doc.name} - {doc.text}\nsource: {doc.url}"
             origin_2_doc[origin].append(text)
 
         # merge texts
         rule_texts = ""
-        for origin, texts in origin_2_doc.items():
+        for origin, origin_texts in origin_2_doc.items():
             rule_texts += origin + ":\n"
-            for text in texts:
+            for text in origin_texts:
                 rule_texts += f"{text}\n\n"
+        rule_texts += self._format_references(documents[:n_packed])
         if rule_texts:
             return rule_texts
         else:
             return "No Rules found"
+
+    def _format_references(self, documents: list[Document]) -> str:
+        """rules referenced by the found rules, so they need no extra lookups"""
+        if self.rules_router is None or self.reference_depth <= 0:
+            return ""
+
+        rule_ids = [doc.name.strip().rstrip(".") for doc in documents]
+        references = self.rules_router.referenced_rules(rule_ids, self.reference_depth)
+        texts = []
+        for rule_id in references:
+            doc = self.rules_router.get(rule_id)
+            texts.append(f"{doc['name']} - {doc['text']}\nsource: {doc['url']}")
+        if not texts:
+            return ""
+        if self.reference_token_budget is not None:
+            texts = self.reference_token_budget.pack(
+                [[text] for text in texts], name=f"{self.name} references"
+            )
+
+        logger.info(f"attached {len(texts)} referenced rules")
+        return "Referenced Rules:\n" + "".join(f"{text}\n\n" for text in texts)
+
+    async def _astream_response(self, payload: dict, key: tuple) -> str:
+        """decodes the documents while the response is transferred"""
+        response = []
+        results = []
+        async for result in get_dataservice_client().stream_post(
+            f"{self.url}rules", payload
+        ):
+            response.append(result)
+            results.append(self._decode_result(result))
+        if self.use_cache:
+            get_response_cache().set(key, response)
+        return self._format_results(results)
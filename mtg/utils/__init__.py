@@ -1,3 +1,20 @@
-from .url_parsing import parse_card_names
+from .url_parsing import (
+    parse_card_names,
+    StreamingCardLinker,
+    alink_card_names,
+    CardUrlIndex,
+    LocalCardLinker,
+    load_card_url_index,
+)
 from .config import load_config, MTGBotConfig
 from .ui import to_sync_generator
+from .dataservice_client import DataserviceClient, get_dataservice_client
+from .response_cache import ResponseCache, get_response_cache
+from .token_budget import TokenBudget, get_token_budget
+from .json_stream import JsonArrayParser, iter_json_array
+from .answer_cache import (
+    AnswerCache,
+    answer_context,
+    get_answer_cache,
+    replay_answer,
+)
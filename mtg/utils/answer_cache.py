@@ -0,0 +1,196 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+from rapidfuzz import fuzz, process
+
+from .config import AnswerCacheSettings
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# power/toughness and counters like 5/5, x/x or +1/+1 are kept as one token
+TOKEN_PATTERN = re.compile(r"[+-]?[\dx*]+/[+-]?[\dx*]+|\w+")
+NEGATIONS = frozenset(
+    ["no", "not", "never", "without", "cannot", "cant", "dont", "doesnt", "isnt"]
+    + ["arent", "wont", "shouldnt", "wouldnt", "couldnt", "didnt", "hasnt"]
+)
+
+AnswerContext = tuple[tuple[str, ...], tuple[str, ...], tuple[str, ...], str, str]
+
+
+def normalize_query(query: str) -> str:
+    """lowercases, drops punctuation except in p/t tokens and collapses whitespace"""
+    query = query.lower().replace("'", "").replace("’", "")
+    return " ".join(TOKEN_PATTERN.findall(query))
+
+
+def key_terms(query: str) -> tuple[str, ...]:
+    """numbers, p/t, rule ids and negations in order, similar queries must agree on them"""
+    return tuple(
+        token
+        for token in normalize_query(query).split()
+        if token in NEGATIONS or "/" in token or any(char.isdigit() for char in token)
+    )
+
+
+def deck_digest(decks: dict[str, str]) -> str:
+    """digest of the uploaded decks, answers about other decks are not shared"""
+    data = json.dumps(decks, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def answer_context(
+    query: str,
+    card_names: Iterable[str],
+    keywords: Iterable[str],
+    decks: dict[str, str],
+    model_name: str,
+) -> AnswerContext:
+    """the part of the cache key that has to match exactly"""
+    return (
+        key_terms(query),
+        tuple(sorted({keyword.lower() for keyword in keywords})),
+        tuple(sorted({card_name.lower() for card_name in card_names})),
+        deck_digest(decks),
+        model_name,
+    )
+
+
+class AnswerCache:
+    """Thread safe cache of whole agent answers.
+
+    Answers are stored under their context (numbers, p/t and negations of
+    the query, recognized rules keywords and card names, uploaded decks and
+    model version) and the normalized query. A lookup returns the answer of
+    the most similar query in the same context if its similarity is at least
+    similarity_threshold. Lookups with similar=False only return the answer
+    of the same normalized query, e.g. when card names can not be recognized.
+    Entries expire after ttl seconds, the least recently used entries are
+    evicted after max_entries.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 86400,
+        max_entries: int = 1024,
+        similarity_threshold: float = 0.92,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        # (context, normalized query) -> (expires at, answer)
+        self._entries: OrderedDict[tuple[AnswerContext, str], tuple[float, str]] = (
+            OrderedDict()
+        )
+        self._queries: dict[AnswerContext, set[str]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "similar_hits": 0, "misses": 0, "bypasses": 0}
+
+    @classmethod
+    def from_settings(cls, settings: AnswerCacheSettings) -> "AnswerCache":
+        return cls(
+            ttl=settings.ttl,
+            max_entries=settings.max_entries,
+            similarity_threshold=settings.similarity_threshold,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: tuple[AnswerContext, str]):
+        self._entries.pop(key)
+        context, query = key
+        self._queries[context].discard(query)
+        if not self._queries[context]:
+            del self._queries[context]
+
+    def _find(self, context: AnswerContext, query: str, similar: bool) -> Optional[str]:
+        """the cached query of the context most similar to the query"""
+        if (context, query) in self._entries:
+            return query
+        if not similar:
+            return None
+        queries = self._queries.get(context)
+        if not queries:
+            return None
+        match = process.extractOne(
+            query,
+            queries,
+            scorer=fuzz.ratio,
+            score_cutoff=self.similarity_threshold * 100,
+        )
+        return match[0] if match is not None else None
+
+    def get(
+        self, context: AnswerContext, query: str, similar: bool = True
+    ) -> Optional[str]:
+        query = normalize_query(query)
+        with self._lock:
+            cached_query = self._find(context, query, similar)
+            if cached_query is None:
+                self._stats["misses"] += 1
+                return None
+
+            key = (context, cached_query)
+            expires_at, answer = self._entries[key]
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            if cached_query != query:
+                self._stats["similar_hits"] += 1
+        logger.info(f"answer cache hit for '{query}' with '{cached_query}'")
+        return answer
+
+    def set(self, context: AnswerContext, query: str, answer: str):
+        key = (context, normalize_query(query))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, answer)
+            self._queries.setdefault(context, set()).add(key[1])
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def bypass(self):
+        """counts a question that was not looked up, e.g. with a chat history"""
+        with self._lock:
+            self._stats["bypasses"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._queries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+
+def replay_answer(answer: str) -> Iterator[str]:
+    """streams a cached answer in word chunks like a generated one"""
+    for chunk in re.findall(r"\S+\s*|\s+", answer):
+        yield chunk
+
+
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache(settings: Optional[AnswerCacheSettings] = None) -> AnswerCache:
+    """returns the process wide answer cache, created with the settings of the first call"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache.from_settings(settings or AnswerCacheSettings())
+    return _cache
@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from typing import Literal, Optional
 import yaml
 from pydantic import BaseModel, Field
 from functools import cache
@@ -15,6 +16,30 @@ class LLMSettings(BaseModel):
         default="gpt-4o-mini",
         description="openai model version powering the secondary agent the judge",
     )
+    pipeline_judge: bool = Field(
+        default=False,
+        description="research for the judge while nissa answers and run the judge right after her",
+    )
+    judge_evidence_turns: int = Field(
+        default=2,
+        description="number of last turns whose tool results the judge gets as evidence",
+    )
+    judge_evidence_token_budget: Optional[int] = Field(
+        default=4000,
+        description="maximum number of tokens of the evidence in the judge prompt, None for no limit",
+    )
+    memory_token_limit: int = Field(
+        default=3000,
+        description="maximum number of tokens of the conversation history sent with every turn",
+    )
+    memory_summary_token_limit: int = Field(
+        default=500,
+        description="maximum number of tokens of the summary of older turns, part of memory_token_limit",
+    )
+    memory_summary_llm_model_version: Optional[str] = Field(
+        default="gpt-4o-mini",
+        description="openai model version summarizing older turns, None to drop them",
+    )
 
 
 class LangfuseSettings(BaseModel):
@@ -39,6 +64,90 @@ class DataserviceSettings(BaseModel):
         default=0.75,
         description="threshold for the similarity to the search query for rules search",
     )
+    card_search_token_budget: Optional[int] = Field(
+        default=4000,
+        description="maximum number of tokens of the card search tool output, None for no limit",
+    )
+    rules_search_token_budget: Optional[int] = Field(
+        default=3000,
+        description="maximum number of tokens of the rules search tool output, None for no limit",
+    )
+    request_timeout: float = Field(
+        default=10.0,
+        description="timeout in seconds for requests to the dataservice",
+    )
+    connection_limit: int = Field(
+        default=100,
+        description="maximum number of open connections of the dataservice client",
+    )
+    connection_limit_per_host: int = Field(
+        default=20,
+        description="maximum number of open connections to the same host",
+    )
+    keepalive_timeout: float = Field(
+        default=30.0,
+        description="seconds an idle connection is kept open for reuse",
+    )
+    stream_search_responses: bool = Field(
+        default=False,
+        description="parse card and rules search responses while they are transferred",
+    )
+    cache_ttl: float = Field(
+        default=3600,
+        description="seconds a card or rules search response stays in the cache",
+    )
+    cache_max_entries: int = Field(
+        default=2048,
+        description="maximum number of cached search responses",
+    )
+    cache_max_bytes: int = Field(
+        default=64_000_000,
+        description="maximum size of all cached search responses in bytes",
+    )
+    card_snapshot_path: Optional[str] = Field(
+        default=None,
+        description="json file with all cards, used to link card urls without the dataservice",
+    )
+    card_matcher_artifact_dir: Optional[str] = Field(
+        default="data/models",
+        description="directory of the precompiled card name matcher, none to build it in memory",
+    )
+    card_store_path: Optional[str] = Field(
+        default=None,
+        description="directory of the local card store, card name lookups use it before the dataservice",
+    )
+    card_search_mode: Literal["remote", "local", "local_with_remote_fallback"] = Field(
+        default="remote",
+        description="search cards with the dataservice, the local vector index or locally with the dataservice as fallback",
+    )
+    rules_index_path: Optional[str] = Field(
+        default=None,
+        description="directory of the local bm25 rules index",
+    )
+    rules_search_mode: Literal["remote", "local", "hybrid"] = Field(
+        default="remote",
+        description="search rules with the dataservice, the local bm25 index or both merged with reciprocal rank fusion",
+    )
+    rules_reference_depth: int = Field(
+        default=0,
+        description="attach rules referenced by the found rules up to this many hops, 0 to turn it off",
+    )
+    rules_reference_token_budget: Optional[int] = Field(
+        default=1000,
+        description="maximum number of tokens of the attached referenced rules",
+    )
+    embedding_model: str = Field(
+        default="text-embedding-3-small",
+        description="openai embedding model of the local card vector index, has to match the precomputed card embeddings",
+    )
+    link_matched_card_names: bool = Field(
+        default=False,
+        description="also link card names that are not marked with <<Card Name>>",
+    )
+    prefetch_card_names: bool = Field(
+        default=False,
+        description="look up the cards named in a query while the first llm step runs, needs card_snapshot_path",
+    )
 
 
 class RateLimitSettings(BaseModel):
@@ -46,11 +155,32 @@ class RateLimitSettings(BaseModel):
     waiting_time: int = Field(description="waiting time in minutes")
 
 
+class AnswerCacheSettings(BaseModel):
+    enabled: bool = Field(
+        default=False,
+        description="answer repeated first questions of a conversation from a cache",
+    )
+    ttl: float = Field(
+        default=86400, description="seconds a cached answer stays in the cache"
+    )
+    max_entries: int = Field(
+        default=1024, description="maximum number of cached answers"
+    )
+    similarity_threshold: float = Field(
+        default=0.92,
+        description="minimum similarity between 0 and 1 of a normalized query to a cached one, "
+        "only used with a card snapshot and a rules index",
+    )
+
+
 class MTGBotConfig(BaseModel):
     dataservice_settings: DataserviceSettings
     llm_settings: LLMSettings
     langfuse_settings: LangfuseSettings
     rate_limit_settings: RateLimitSettings
+    answer_cache_settings: AnswerCacheSettings = Field(
+        default_factory=AnswerCacheSettings
+    )
 
 
 @cache
@@ -0,0 +1,245 @@
+import asyncio
+import atexit
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Coroutine, Hashable, Optional
+
+import aiohttp
+
+from .config import DataserviceSettings
+from .json_stream import iter_json_array
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+_END = object()
+
+
+class DataserviceClient:
+    """Process wide http client for the dataservice.
+
+    All requests run on one event loop in a background thread, with one aiohttp
+    session and a keep-alive connection pool. Callers on any event loop (e.g. the
+    loops created by to_sync_generator) await the result through a thread safe
+    future, sync callers block on it.
+
+    Identical requests that are in flight at the same time are merged: callers
+    with the same key await one shared request. Errors are raised to every
+    waiting caller, a cancelled caller does not cancel the request for others.
+    A request without any waiting caller left is cancelled.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        timeout: float = 10.0,
+        keepalive_timeout: float = 30.0,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+
+        self._stats = {
+            "requests": 0,
+            "errors": 0,
+            "in_flight": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "merged": 0,
+            "streamed": 0,
+        }
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="dataservice-client", daemon=True
+        )
+        self._thread.start()
+
+    @classmethod
+    def from_settings(cls, settings: DataserviceSettings) -> "DataserviceClient":
+        return cls(
+            limit=settings.connection_limit,
+            limit_per_host=settings.connection_limit_per_host,
+            timeout=settings.request_timeout,
+            keepalive_timeout=settings.keepalive_timeout,
+        )
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        async def on_connection_create_end(session, context, params):
+            self._stats["connections_created"] += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self._stats["connections_reused"] += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[trace_config],
+            raise_for_status=True,
+        )
+
+    async def _request(self, method: str, url: str, data: Any = None) -> Any:
+        """runs on the client loop"""
+        if self._session is None:
+            self._session = self._create_session()
+
+        self._stats["requests"] += 1
+        self._stats["in_flight"] += 1
+        try:
+            async with self._session.request(method, url, json=data) as response:
+                return await response.json()
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        finally:
+            self._stats["in_flight"] -= 1
+
+    async def _stream_request(
+        self, method: str, url: str, data: Any, put: Callable[[Any], None]
+    ):
+        """runs on the client loop, hands every element of a json array to put"""
+        if self._session is None:
+            self._session = self._create_session()
+
+        self._stats["requests"] += 1
+        self._stats["streamed"] += 1
+        self._stats["in_flight"] += 1
+        try:
+            async with self._session.request(method, url, json=data) as response:
+                async for element in iter_json_array(response.content.iter_any()):
+                    put(element)
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        finally:
+            self._stats["in_flight"] -= 1
+
+    async def _merged_request(
+        self, method: str, url: str, data: Any, key: Optional[Hashable]
+    ) -> Any:
+        """runs on the client loop, joins an identical request if one is in flight"""
+        if key is None:
+            key = (method, url, json.dumps(data, sort_keys=True))
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._loop.create_task(self._request(method, url, data))
+            self._in_flight[key] = task
+
+            def done(task: asyncio.Task):
+                if self._in_flight.get(key) is task:
+                    del self._in_flight[key]
+                if not task.cancelled():
+                    # mark the error as retrieved, even if every caller went away
+                    task.exception()
+
+            task.add_done_callback(done)
+        else:
+            self._stats["merged"] += 1
+
+        # shield: a cancelled caller must not cancel the request of the others,
+        # the request is only cancelled when its last caller went away
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1:
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """runs a coroutine on the client loop, e.g. to fetch in the background"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def post(self, url: str, data: Any, key: Optional[Hashable] = None) -> Any:
+        return await asyncio.wrap_future(
+            self.submit(self._merged_request("POST", url, data, key))
+        )
+
+    async def get(self, url: str, key: Optional[Hashable] = None) -> Any:
+        return await asyncio.wrap_future(
+            self.submit(self._merged_request("GET", url, None, key))
+        )
+
+    def post_sync(self, url: str, data: Any, key: Optional[Hashable] = None) -> Any:
+        return self.submit(self._merged_request("POST", url, data, key)).result()
+
+    def get_sync(self, url: str, key: Optional[Hashable] = None) -> Any:
+        return self.submit(self._merged_request("GET", url, None, key)).result()
+
+    async def stream_post(self, url: str, data: Any) -> AsyncIterator[Any]:
+        """posts to an endpoint that returns a json array and yields its elements
+        as soon as they arrive, streamed requests are not merged"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def put(element: Any):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(queue.put_nowait, element)
+
+        future = self.submit(self._stream_request("POST", url, data, put))
+        future.add_done_callback(lambda _: put(_END))
+        try:
+            while (element := await queue.get()) is not _END:
+                yield element
+            if future.cancelled():
+                raise asyncio.CancelledError()
+            if future.exception() is not None:
+                raise future.exception()
+        finally:
+            # stops the transfer if the caller stopped early
+            future.cancel()
+
+    def stats(self) -> dict:
+        """request, merge, streaming and connection pool statistics"""
+        stats = dict(self._stats)
+        stats["in_flight_keys"] = len(self._in_flight)
+        stats["limit"] = self.limit
+        stats["limit_per_host"] = self.limit_per_host
+        return stats
+
+    def close(self):
+        """closes the session and stops the client loop"""
+        if self._session is not None:
+            self.submit(self._session.close()).result()
+            self._session = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_client: Optional[DataserviceClient] = None
+_client_lock = threading.Lock()
+
+
+def get_dataservice_client(
+    settings: Optional[DataserviceSettings] = None,
+) -> DataserviceClient:
+    """returns the process wide client, it is created with the settings of the first call"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            settings = settings or DataserviceSettings()
+            _client = DataserviceClient.from_settings(settings)
+            atexit.register(_client.close)
+            logger.info(
+                f"created dataservice client with {settings.connection_limit_per_host} "
+                "connections per host"
+            )
+    return _client
@@ -0,0 +1,77 @@
+import codecs
+import json
+from typing import Any, AsyncIterator
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class JsonArrayParser:
+    """Incremental parser for a json array that arrives in chunks of bytes.
+
+    feed returns every element that is complete after the chunk, so elements
+    can be handled while the rest of the array is still being transferred.
+    Only the text of the element that is not complete yet is buffered.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._started = False
+        self._finished = False
+
+    def _skip(self, pos: int) -> int:
+        while pos < len(self._buffer) and self._buffer[pos] in _WHITESPACE:
+            pos += 1
+        return pos
+
+    def feed(self, chunk: bytes, final: bool = False) -> list[Any]:
+        self._buffer += self._decoder.decode(chunk, final=final)
+        elements = []
+        pos = self._skip(0)
+
+        if not self._started and pos < len(self._buffer):
+            if self._buffer[pos] != "[":
+                raise ValueError(f"expected a json array, got {self._buffer[:20]!r}")
+            self._started = True
+            pos = self._skip(pos + 1)
+
+        while self._started and not self._finished and pos < len(self._buffer):
+            if self._buffer[pos] == "]":
+                self._finished = True
+                pos += 1
+                break
+            if self._buffer[pos] == ",":
+                pos = self._skip(pos + 1)
+                if pos == len(self._buffer):
+                    break
+            try:
+                element, end = _decoder.raw_decode(self._buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                break  # element is not complete yet
+            if not isinstance(element, (dict, list, str)) and not final:
+                # a number is only complete when a delimiter follows it
+                if (
+                    end == len(self._buffer)
+                    or self._buffer[end] not in ",]" + _WHITESPACE
+                ):
+                    break
+            elements.append(element)
+            pos = self._skip(end)
+
+        self._buffer = self._buffer[pos:]
+        if final and not self._finished:
+            raise ValueError("json array ended before its closing bracket")
+        return elements
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """yields the elements of a json array while its bytes arrive"""
+    parser = JsonArrayParser()
+    async for chunk in chunks:
+        for element in parser.feed(chunk):
+            yield element
+    for element in parser.feed(b"", final=True):
+        yield element
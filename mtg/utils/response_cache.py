@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from .config import DataserviceSettings
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+_MISSING = object()
+
+
+def normalize_text(text: Optional[str]) -> Optional[str]:
+    """lowercases and collapses whitespace so equal queries share a cache key"""
+    if text is None:
+        return None
+    return " ".join(text.lower().split())
+
+
+def normalize_list(values: Optional[list[str]]) -> tuple[str, ...]:
+    return tuple(sorted({normalize_text(value) for value in values or []}))
+
+
+class ResponseCache:
+    """Thread safe TTL cache with LRU eviction for dataservice responses.
+
+    Entries expire after ttl seconds. If more than max_entries entries or more
+    than max_bytes (size of the json encoded response) are stored, the least
+    recently used entries are evicted.
+
+    Keys can be tagged before their response is fetched, e.g. by a prefetch.
+    The first lookup of a tagged key counts as a hit of the tag, also while
+    the response is still in flight.
+    """
+
+    def __init__(
+        self, ttl: float = 3600, max_entries: int = 2048, max_bytes: int = 64_000_000
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, tuple[float, int, Any]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        self._tags: dict[Hashable, str] = {}
+        self._tag_stats: dict[str, dict[str, int]] = {}
+
+    @classmethod
+    def from_settings(cls, settings: DataserviceSettings) -> "ResponseCache":
+        return cls(
+            ttl=settings.cache_ttl,
+            max_entries=settings.cache_max_entries,
+            max_bytes=settings.cache_max_bytes,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """checks for an entry without counting a hit or a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def tag(self, key: Hashable, tag: str):
+        with self._lock:
+            self._tags[key] = tag
+            stats = self._tag_stats.setdefault(tag, {"tagged": 0, "hits": 0})
+            stats["tagged"] += 1
+
+    def untag(self, key: Hashable):
+        with self._lock:
+            self._tags.pop(key, None)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            tag = self._tags.pop(key, None)
+            if tag is not None:
+                self._tag_stats[tag]["hits"] += 1
+
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        size = len(json.dumps(value, default=str))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._size += size
+
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._size > self.max_bytes
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._stats["evictions"] += 1
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+        self._tags.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._size = 0
+
+    async def aget_or_fetch(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """returns the cached response or awaits fetch and caches its result"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = await fetch()
+            self.set(key, value)
+        return value
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        """returns the cached response or calls fetch and caches its result"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = fetch()
+            self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        """hit, miss, eviction and expiration counts and the current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._size
+            stats["tags"] = {
+                tag: dict(tag_stats) for tag, tag_stats in self._tag_stats.items()
+            }
+        return stats
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache(
+    settings: Optional[DataserviceSettings] = None,
+) -> ResponseCache:
+    """returns the process wide cache, it is created with the settings of the first call"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache.from_settings(settings or DataserviceSettings())
+    return _cache
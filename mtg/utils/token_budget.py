@@ -0,0 +1,108 @@
+import threading
+from functools import cache
+from typing import Optional
+
+import tiktoken
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@cache
+def get_encoding(encoding_name: str) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(encoding_name)
+
+
+class TokenBudget:
+    """Packs tool output into a maximum number of tokens.
+
+    Records are given in rank order, every record as a list of variants from
+    the most to the least detailed (e.g. a card with rulings, without rulings,
+    without rulings and price). If all records do not fit, the records are
+    trimmed to their next variant from the lowest ranked one upwards, one
+    level at a time. If they still do not fit, whole records are dropped from
+    the end. The first record is always kept, records are never cut.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        encoding_name: str = "o200k_base",
+        separator: str = "\n\n",
+    ):
+        self.max_tokens = max_tokens
+        self.encoding_name = encoding_name
+        self.separator = separator
+        self._stats = {
+            "calls": 0,
+            "packed_tokens": 0,
+            "dropped_tokens": 0,
+            "trimmed_records": 0,
+            "dropped_records": 0,
+        }
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        return len(get_encoding(self.encoding_name).encode(text, disallowed_special=()))
+
+    def pack(self, records: list[list[str]], name: Optional[str] = None) -> list[str]:
+        """returns the variant of every record that made it into the budget"""
+        records = [variants for variants in records if variants]
+        tokens = [[self.count(variant) for variant in variants] for variants in records]
+        separator_tokens = self.count(self.separator)
+        levels = [0] * len(records)
+
+        def total(n_records: int) -> int:
+            return sum(tokens[i][levels[i]] for i in range(n_records)) + (
+                separator_tokens * max(n_records - 1, 0)
+            )
+
+        n_records = len(records)
+        max_level = max((len(variants) for variants in records), default=1) - 1
+        for level in range(1, max_level + 1):
+            if total(n_records) <= self.max_tokens:
+                break
+            for i in reversed(range(n_records)):
+                levels[i] = min(level, len(records[i]) - 1)
+                if total(n_records) <= self.max_tokens:
+                    break
+
+        while n_records > 1 and total(n_records) > self.max_tokens:
+            n_records -= 1
+
+        full_tokens = sum(variant_tokens[0] for variant_tokens in tokens) + (
+            separator_tokens * max(len(records) - 1, 0)
+        )
+        packed_tokens = total(n_records)
+        stats = {
+            "packed_tokens": packed_tokens,
+            "dropped_tokens": full_tokens - packed_tokens,
+            "trimmed_records": sum(1 for level in levels[:n_records] if level),
+            "dropped_records": len(records) - n_records,
+        }
+        with self._lock:
+            self._stats["calls"] += 1
+            for key, value in stats.items():
+                self._stats[key] += value
+
+        logger.info(
+            f"packed {n_records} of {len(records)} records from {name or 'tool'} "
+            f"into {packed_tokens} of {self.max_tokens} tokens, "
+            f"dropped {stats['dropped_tokens']} tokens "
+            f"({stats['trimmed_records']} trimmed, {stats['dropped_records']} dropped)"
+        )
+        return [records[i][levels[i]] for i in range(n_records)]
+
+    def stats(self) -> dict:
+        """packed and dropped tokens and records of all calls"""
+        with self._lock:
+            return dict(self._stats)
+
+
+@cache
+def get_token_budget(name: str, max_tokens: Optional[int]) -> Optional[TokenBudget]:
+    """process wide token budget of a tool, None if its output is not limited"""
+    if max_tokens is None:
+        return None
+    return TokenBudget(max_tokens)
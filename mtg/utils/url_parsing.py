@@ -1,11 +1,265 @@
-import requests
+import asyncio
+import json
+import re
+from functools import cache
+from pathlib import Path
+from typing import AsyncGenerator, AsyncIterator, Callable
 from urllib.parse import urljoin
 
+from spacy.language import Language
+from spacy.tokens import Span
+
+from .dataservice_client import get_dataservice_client
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+CARD_MARKER_PATTERN = re.compile(r"<<(.+?)>>")
+
 
 def parse_card_names(text, url, endpoint):
     request = {"text": text}
-    response = requests.post(urljoin(url, endpoint), json=request)
-    if response.status_code == 200:
-        response = response.json()
-        return response["text"]
-    return text
+    try:
+        response = get_dataservice_client().post_sync(urljoin(url, endpoint), request)
+    except Exception as e:
+        logger.error(f"could not parse card urls: {e}")
+        return text
+    return response["text"]
+
+
+def normalize_card_name(card_name: str) -> str:
+    return " ".join(card_name.lower().split())
+
+
+def card_name_variants(card_name: str, include_sides: bool = True) -> list[str]:
+    """full name first, then the short name before the comma and the dfc sides"""
+    names = [card_name]
+    if "," in card_name:
+        names.append(card_name.split(",")[0])
+    if include_sides and "//" in card_name:
+        names.extend(card_name.split("//"))
+    return names
+
+
+def card_name_keys(card_name: str) -> list[str]:
+    """normalized name variants of a card, the full name first"""
+    return [normalize_card_name(name) for name in card_name_variants(card_name)]
+
+
+class CardUrlIndex:
+    """In memory index from card names to card urls.
+
+    Besides the full name, short names before the comma and both sides of
+    double faced cards point to the url of the card, unless another card
+    has that full name.
+    """
+
+    def __init__(self, card_urls: dict[str, str]):
+        self.card_urls = card_urls
+        self._index: dict[str, str] = {}
+        # short names and dfc sides never take the key of a full name
+        variant_index: dict[str, str] = {}
+        for card_name, url in card_urls.items():
+            full_name, *variants = card_name_keys(card_name)
+            self._index.setdefault(full_name, url)
+            for name in variants:
+                variant_index.setdefault(name, url)
+        self._index = {**variant_index, **self._index}
+        # a streamed text is held back by this many words
+        self.max_name_words = max(
+            (len(card_name.split()) for card_name in card_urls), default=1
+        )
+
+    def __len__(self) -> int:
+        return len(self.card_urls)
+
+    def get(self, card_name: str) -> str | None:
+        return self._index.get(normalize_card_name(card_name))
+
+    @classmethod
+    def from_cards(cls, cards: list[dict]) -> "CardUrlIndex":
+        """builds the index from card dicts in the shape of the Card object"""
+        return cls({card["name"]: card["url"] for card in cards if card.get("url")})
+
+
+@cache
+def load_card_url_index(filepath: Path) -> CardUrlIndex:
+    """loads the card url index from a json card snapshot"""
+    filepath = Path(filepath)
+    with filepath.open("r", encoding="utf-8") as infile:
+        cards = json.load(infile)
+    index = CardUrlIndex.from_cards(cards)
+    logger.info(f"loaded {len(index)} card urls from {filepath}")
+    return index
+
+
+class LocalCardLinker:
+    """Links card names without a request to the dataservice.
+
+    <<Card Name>> markers are resolved with the card url index. If a spacy
+    pipeline with the card name matcher is given, matched names outside of
+    markers are linked too. Only names that are missing in the index are sent
+    to the dataservice.
+    """
+
+    def __init__(
+        self,
+        index: CardUrlIndex,
+        url: str = None,
+        endpoint: str = "parse_card_urls",
+        nlp: Language = None,
+    ):
+        self.index = index
+        self.url = url
+        self.endpoint = endpoint
+        self.nlp = nlp
+
+    def _link_marker(self, card_name: str) -> str:
+        url = self.index.get(card_name)
+        if url is not None:
+            return f"[{card_name}]({url})"
+        if self.url is None:
+            return card_name
+        logger.info(f"card '{card_name}' not in url index, asking dataservice")
+        return parse_card_names(f"<<{card_name}>>", self.url, self.endpoint)
+
+    def _link_matched_names(self, text: str) -> str:
+        doc = self.nlp(text)
+        linked_text = ""
+        position = 0
+        for ent in doc.ents:
+            url = self._url(ent)
+            if url is None:
+                continue
+            linked_text += text[position : ent.start_char]
+            linked_text += f"[{ent.text}]({url})"
+            position = ent.end_char
+        return linked_text + text[position:]
+
+    def _url(self, ent: Span) -> str | None:
+        # the matched text first, a short name can also be the name of another card
+        return self.index.get(ent.text) or self.index.get(ent.label_)
+
+    def match_spans(self, text: str) -> list[tuple[int, int]]:
+        """character spans of the card names the pipeline finds in a text"""
+        if self.nlp is None:
+            return []
+        return [
+            (ent.start_char, ent.end_char)
+            for ent in self.nlp(text).ents
+            if self._url(ent) is not None
+        ]
+
+    def __call__(self, text: str) -> str:
+        linked_text = ""
+        position = 0
+        for match in CARD_MARKER_PATTERN.finditer(text):
+            unmarked_text = text[position : match.start()]
+            if self.nlp is not None and unmarked_text.strip():
+                unmarked_text = self._link_matched_names(unmarked_text)
+            linked_text += unmarked_text + self._link_marker(match.group(1))
+            position = match.end()
+
+        unmarked_text = text[position:]
+        if self.nlp is not None and unmarked_text.strip():
+            unmarked_text = self._link_matched_names(unmarked_text)
+        return linked_text + unmarked_text
+
+
+class StreamingCardLinker:
+    """Links card names in a text while it is still streamed.
+
+    Text is emitted as soon as it can not be part of a card name anymore. Only a
+    trailing window is held back: an unfinished <<Card Name>> marker and the last
+    holdback_words words, which could still be the start of a card name. Text
+    without markers is only linked if link_unmarked is set, e.g. for the local
+    card linker. With match_spans the emitted text also never ends inside a card
+    name that was matched in the held back text.
+    """
+
+    def __init__(
+        self,
+        link: Callable[[str], str],
+        holdback_words: int = 4,
+        link_unmarked: bool = False,
+        match_spans: Callable[[str], list[tuple[int, int]]] = None,
+    ):
+        self.link = link
+        self.holdback_words = holdback_words
+        self.link_unmarked = link_unmarked
+        self.match_spans = match_spans
+        self._buffer = ""
+
+    @classmethod
+    def from_local_linker(
+        cls, linker: "LocalCardLinker", link_unmarked: bool = False
+    ) -> "StreamingCardLinker":
+        """holds back the words of the longest card name of the url index"""
+        return cls(
+            link=linker,
+            holdback_words=linker.index.max_name_words,
+            link_unmarked=link_unmarked,
+            match_spans=linker.match_spans if link_unmarked else None,
+        )
+
+    def _safe_cut(self) -> int:
+        """position up to which the buffer can be linked and emitted"""
+        buffer = self._buffer
+        # a trailing "<" or "<<" can start a marker
+        cut = len(buffer.rstrip("<"))
+
+        # hold back the last words
+        if self.holdback_words:
+            whitespaces = [match.start() for match in re.finditer(r"\s+", buffer)]
+            if len(whitespaces) < self.holdback_words:
+                return 0
+            cut = min(cut, whitespaces[-self.holdback_words])
+
+        # never split a card name marker
+        head = buffer[:cut]
+        open_marker = head.rfind("<<")
+        if open_marker > head.rfind(">>"):
+            cut = open_marker
+
+        # never split a matched card name
+        if cut and self.match_spans is not None:
+            for start, end in self.match_spans(buffer):
+                if start < cut < end:
+                    cut = start
+        return cut
+
+    def _link(self, text: str) -> str:
+        if "<<" not in text and not self.link_unmarked:
+            return text
+        return self.link(text)
+
+    def feed(self, chunk: str) -> str:
+        """adds a chunk and returns the linked text that is ready to display"""
+        self._buffer += chunk
+        cut = self._safe_cut()
+        if not cut:
+            return ""
+        text, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return self._link(text)
+
+    def flush(self) -> str:
+        """links and returns everything that is still held back"""
+        text, self._buffer = self._buffer, ""
+        return self._link(text) if text else ""
+
+
+async def alink_card_names(
+    stream: AsyncIterator[str], linker: StreamingCardLinker
+) -> AsyncGenerator[str, None]:
+    """wraps a chunk stream and yields linked markdown instead of raw chunks
+
+    The linking runs in a worker thread, the card matcher and the requests for
+    names missing in the url index would block the loop of the stream.
+    """
+    async for chunk in stream:
+        text = await asyncio.to_thread(linker.feed, chunk)
+        if text:
+            yield text
+    text = await asyncio.to_thread(linker.flush)
+    if text:
+        yield text
@@ -1,4 +1,5 @@
-from typing import Protocol
+from functools import cache
+from typing import Callable, Optional, Protocol
 import streamlit as st
 from uuid import uuid4
 
@@ -7,12 +8,18 @@ from mtg.utils.logging import get_logger
 from mtg.agents import nissa, judge, user
 from mtg.utils import (
     parse_card_names,
+    StreamingCardLinker,
+    LocalCardLinker,
+    alink_card_names,
+    load_card_url_index,
     to_sync_generator,
     MTGBotConfig,
+    answer_context,
+    get_answer_cache,
+    replay_answer,
 )
 from mtg.views.chat.cookie_handler import increase_request_count
 
-
 langfuse = Langfuse()
 
 logger = get_logger("mtg-bot")
@@ -30,6 +37,9 @@ Thanks so much for your patience and understanding. If you’re enjoying the bot
 
 """
 
+ERROR_TEXT = """Sorry, something went wrong, please try reloading the page...  
+        If this Problem continues, please contact the admin."""
+
 
 class Agent(Protocol):
     def astream_response():
@@ -56,18 +66,78 @@ def handle_chat(config: MTGBotConfig, callback_handler=None):
         with st.chat_message("user", avatar=user.PROFILE_PICTURE):
             st.markdown(query)
 
+        # the first question of a conversation can be answered from the cache
+        answer_cache = None
+        cached_answer = None
+        if config.answer_cache_settings.enabled:
+            answer_cache = get_answer_cache(config.answer_cache_settings)
+            if st.session_state.agent.memory.buffer_as_messages:
+                answer_cache.bypass()
+                answer_cache = None
+            else:
+                card_names = recognize_card_names(config, query)
+                keywords = recognize_keywords(config, query)
+                context = answer_context(
+                    query,
+                    card_names=card_names or [],
+                    keywords=keywords or [],
+                    decks=st.session_state.deck_tool.decks,
+                    model_name=config.llm_settings.nissa_llm_model_version,
+                )
+                # similar questions about other cards or keywords look alike,
+                # they are only shared if both can be recognized
+                cached_answer = answer_cache.get(
+                    context,
+                    query,
+                    similar=card_names is not None and keywords is not None,
+                )
+
+        card_prefetcher = st.session_state.get("card_prefetcher")
+        judge_research = st.session_state.get("judge_research")
+
+        def start_lookups():
+            # cards named in the query are looked up while nissa starts thinking
+            if card_prefetcher is not None:
+                card_prefetcher.prefetch(query)
+            # in pipelined mode the judge research runs while nissa answers
+            if judge_research is not None:
+                st.session_state.pending_research = judge_research.research(query)
+
+        # tool results of the new turn are kept as evidence for the judge
+        st.session_state.evidence.start_turn()
+
         # Display assistant response in chat message container
         with st.chat_message("nissa", avatar=nissa.PROFILE_PICTURE):
-            parsed_response = call_agent(
-                agent=nissa,
-                agent_executor=st.session_state.agent,
-                query=query,
-                dataservice_host=config.dataservice_settings.host,
-                decks=st.session_state.deck_tool.decks,
-                callback_handler=callback_handler,
-                trace_id=trace_id,
-                session_id=st.session_state.state.session_id,
-                config=config,
+            if cached_answer is not None:
+                parsed_response = st.write_stream(replay_answer(cached_answer))
+                st.session_state.agent.memory.save_context(
+                    {"human_input": query}, {"output": parsed_response}
+                )
+            else:
+                parsed_response = call_agent(
+                    agent=nissa,
+                    agent_executor=st.session_state.agent,
+                    query=query,
+                    dataservice_host=config.dataservice_settings.host,
+                    decks=st.session_state.deck_tool.decks,
+                    evidence=st.session_state.evidence,
+                    before_stream=start_lookups,
+                    callback_handler=callback_handler,
+                    trace_id=trace_id,
+                    session_id=st.session_state.state.session_id,
+                    config=config,
+                )
+                if answer_cache is not None and parsed_response not in (
+                    ERROR_TEXT,
+                    RATE_LIMIT_TEXT,
+                ):
+                    answer_cache.set(context, query, parsed_response)
+
+        if card_prefetcher is not None and cached_answer is None:
+            stats = card_prefetcher.stats()
+            logger.info(
+                f"card prefetch hit rate: {stats['hit_rate']:.0%} "
+                f"({stats['hits']} of {stats['prefetched']} prefetched cards looked up)"
             )
 
         if "@judge" in parsed_response:
@@ -82,15 +152,35 @@ def handle_chat(config: MTGBotConfig, callback_handler=None):
                 "trace_id": trace_id,
             }
         )
-        st.rerun()
+        # in pipelined mode the judge writes its report right after nissa
+        if not (st.session_state.state.judge_called and judge_research is not None):
+            # nissa answered without the judge, its research is not needed
+            pending_research = st.session_state.pop("pending_research", None)
+            if pending_research is not None:
+                pending_research.cancel()
+            st.rerun()
 
     if st.session_state.state.judge_called:
 
+        pending_research = st.session_state.pop("pending_research", None)
+        if pending_research is not None:
+            try:
+                research = pending_research.result(
+                    timeout=config.dataservice_settings.request_timeout
+                )
+                for tool, tool_input, output in research:
+                    st.session_state.evidence.add(tool, tool_input, output)
+            except Exception as e:
+                pending_research.cancel()
+                logger.error(f"judge research failed: {e}")
+
         trace_id = str(uuid4())
         with st.chat_message("judge", avatar=judge.PROFILE_PICTURE):
             parsed_response = call_agent(
                 agent=judge,
                 agent_executor=st.session_state.judge,
+                history=st.session_state.agent.memory.buffer_as_str,
+                evidence=st.session_state.evidence.to_text(),
                 dataservice_host=config.dataservice_settings.host,
                 callback_handler=callback_handler,
                 trace_id=trace_id,
@@ -136,6 +226,63 @@ def display_chat_history():
         record_feedback(feedback)
 
 
+@cache
+def create_card_linker(
+    dataservice_host: str,
+    card_snapshot_path: str = None,
+    link_matched_card_names: bool = False,
+    card_matcher_artifact_dir: str = None,
+) -> Callable[[str], str]:
+    """links card urls locally if a card snapshot is configured, else with the dataservice"""
+    if card_snapshot_path is None:
+        return lambda text: parse_card_names(
+            text,
+            url=dataservice_host,
+            endpoint="parse_card_urls",
+        )
+
+    index = load_card_url_index(card_snapshot_path)
+    nlp = None
+    if link_matched_card_names:
+        from mtg.nlp.card_matcher import load_snapshot_spacy_model
+
+        nlp = load_snapshot_spacy_model(
+            card_snapshot_path, artifact_dir=card_matcher_artifact_dir
+        )
+    return LocalCardLinker(
+        index,
+        url=dataservice_host,
+        endpoint="parse_card_urls",
+        nlp=nlp,
+    )
+
+
+def recognize_card_names(config: MTGBotConfig, query: str) -> Optional[list[str]]:
+    """card names in the query, None without a card snapshot"""
+    card_snapshot_path = config.dataservice_settings.card_snapshot_path
+    if card_snapshot_path is None:
+        return None
+
+    from mtg.nlp.card_matcher import load_snapshot_spacy_model
+
+    nlp = load_snapshot_spacy_model(
+        card_snapshot_path,
+        artifact_dir=config.dataservice_settings.card_matcher_artifact_dir,
+    )
+    return nlp(query)._.card_names
+
+
+def recognize_keywords(config: MTGBotConfig, query: str) -> Optional[list[str]]:
+    """rules keywords in the query, None without a rules index"""
+    rules_index_path = config.dataservice_settings.rules_index_path
+    if rules_index_path is None:
+        return None
+
+    from mtg.search import load_rules_router
+
+    return load_rules_router(rules_index_path).match_keywords(query)
+
+
 def call_agent(
     agent: Agent,
     agent_executor,
@@ -145,6 +292,7 @@ def call_agent(
     config: MTGBotConfig,
     query: str = None,
     callback_handler: callable = None,
+    before_stream: Callable[[], None] = None,
     **kwargs,
 ) -> str:
     """handles agent response"""
@@ -155,6 +303,10 @@ def call_agent(
     if request_count > config.rate_limit_settings.max_requests:
         return RATE_LIMIT_TEXT
 
+    # background lookups only start for requests within the rate limit
+    if before_stream is not None:
+        before_stream()
+
     try:
         stream = agent.astream_response(
             agent_executor=agent_executor,
@@ -165,17 +317,26 @@ def call_agent(
             session_id=session_id,
             **kwargs,
         )
-        generator = to_sync_generator(stream)
-        response = st.write_stream(generator)
-        parsed_response = parse_card_names(
-            response,
-            url=dataservice_host,
-            endpoint="parse_card_urls",
+        # card names are linked while the answer is streamed
+        settings = config.dataservice_settings
+        link = create_card_linker(
+            dataservice_host,
+            card_snapshot_path=settings.card_snapshot_path,
+            link_matched_card_names=settings.link_matched_card_names,
+            card_matcher_artifact_dir=settings.card_matcher_artifact_dir,
         )
+        if isinstance(link, LocalCardLinker):
+            linker = StreamingCardLinker.from_local_linker(
+                link, link_unmarked=settings.link_matched_card_names
+            )
+        else:
+            # the dataservice links the markers of every emitted segment
+            linker = StreamingCardLinker(link, holdback_words=0)
+        generator = to_sync_generator(alink_card_names(stream, linker))
+        parsed_response = st.write_stream(generator)
 
     except Exception as e:
         logger.error(e)
-        parsed_response = """Sorry, something went wrong, please try reloading the page...  
-        If this Problem continues, please contact the admin."""
+        parsed_response = ERROR_TEXT
 
     return parsed_response
@@ -1,18 +1,17 @@
+import time
 import streamlit as st
 from uuid import uuid4
 from langfuse.callback import CallbackHandler
 
-from mtg.agents import create_memory, create_chat_agent, create_judge_agent
+from mtg.agents import SharedAgents, create_shared_agents, create_session_agents
 from mtg.agents import nissa, judge
-from mtg.tools import (
-    CardSearchTool,
-    CardNameSearchTool,
-    RulesSearchTool,
-    UserDeckLookupTool,
-    JudgeReportTool,
-)
 from mtg.utils.logging import get_logger
-from mtg.utils import load_config
+from mtg.utils import (
+    load_config,
+    get_dataservice_client,
+    get_response_cache,
+    MTGBotConfig,
+)
 
 # setup
 st.set_page_config(
@@ -30,6 +29,10 @@ logger = get_logger("mtg-bot")
 
 config = load_config("configs/config.yaml")
 
+# process wide connection pool and response cache shared by all tools and sessions
+get_dataservice_client(config.dataservice_settings)
+get_response_cache(config.dataservice_settings)
+
 langfuse_handler = CallbackHandler()
 
 
@@ -73,49 +76,26 @@ if not st.session_state.state.messages:
         },
     ]
 
-if "agent" not in st.session_state:
-    # add agent, judge + deck tool to session state
-    # setup tools and llm
-    memory = create_memory()
-
-    # tools
-    card_search_tool = CardSearchTool(
-        url=config.dataservice_settings.host,
-        threshold=config.dataservice_settings.card_search_threshold,
-        number_of_cards=config.dataservice_settings.card_search_number_of_cards,
-    )
 
-    card_name_search_tool = CardNameSearchTool(
-        url=config.dataservice_settings.host,
-    )
+@st.cache_resource
+def load_shared_agents(_config: MTGBotConfig) -> SharedAgents:
+    """tools, prompts and agent chains, built once and shared by all sessions"""
+    return create_shared_agents(_config)
 
-    rules_search_tool = RulesSearchTool(
-        url=config.dataservice_settings.host,
-        threshold=config.dataservice_settings.rules_search_threshold,
-    )
-    judge_report_tool = JudgeReportTool()
-    st.session_state.deck_tool = UserDeckLookupTool()
-
-    # agents
-    st.session_state.agent = create_chat_agent(
-        system_message=nissa.SYSTEM_MESSAGE,
-        prompt=nissa.PROMPT,
-        tools=[
-            st.session_state.deck_tool,
-            card_search_tool,
-            card_name_search_tool,
-            rules_search_tool,
-        ],
-        memory=memory,
-        model_name=config.llm_settings.nissa_llm_model_version,
-    )
 
-    st.session_state.judge = create_judge_agent(
-        system_message=judge.SYSTEM_MESSAGE,
-        prompt=judge.PROMPT,
-        tools=[card_name_search_tool, rules_search_tool, judge_report_tool],
-        memory=memory,
-        model_name=config.llm_settings.judge_llm_model_version,
+if "agent" not in st.session_state:
+    # the session only owns its memory, decks and the executors around them
+    start = time.perf_counter()
+    shared_agents = load_shared_agents(config)
+    session_agents = create_session_agents(shared_agents)
+    st.session_state.card_prefetcher = shared_agents.card_prefetcher
+    st.session_state.judge_research = shared_agents.judge_research
+    st.session_state.deck_tool = session_agents.deck_tool
+    st.session_state.agent = session_agents.agent
+    st.session_state.judge = session_agents.judge
+    st.session_state.evidence = session_agents.evidence
+    logger.info(
+        f"created session agents in {(time.perf_counter() - start) * 1000:.1f} ms"
     )
 
 
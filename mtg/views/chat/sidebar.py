@@ -36,6 +36,7 @@ def reset_conversation_button(column: DeltaGenerator):
     """Clears agent memory and resets the history to the welcome messages."""
     if column.button("Reset Conversation", use_container_width=True):
         st.session_state.agent.memory.clear()
+        st.session_state.evidence.clear()
         st.session_state.state.messages = st.session_state.state.messages[:2]
         st.write("resetting conversation")
 
@@ -0,0 +1,78 @@
+import pytest
+from langchain.schema import AIMessage
+
+import mtg.utils.token_budget
+from mtg.agents.evidence import EvidenceStore
+from mtg.utils.token_budget import TokenBudget
+
+
+class WhitespaceEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def encoding(monkeypatch):
+    monkeypatch.setattr(
+        mtg.utils.token_budget, "get_encoding", lambda name: WhitespaceEncoding()
+    )
+
+
+def tools(store: EvidenceStore) -> list[str]:
+    return [block.split("(", 1)[0] for block in store.to_text().split("\n\n") if block]
+
+
+def test_evidence_older_than_max_turns_is_evicted():
+    store = EvidenceStore(max_turns=2)
+    for turn in range(3):
+        store.start_turn()
+        store.add(f"tool_{turn}", {"query": "trample"}, f"output {turn}")
+
+    assert tools(store) == ["tool_2", "tool_1"]
+
+    store.start_turn()
+
+    assert tools(store) == ["tool_2"]
+
+
+def test_a_repeated_call_replaces_the_older_one():
+    store = EvidenceStore(max_turns=2)
+    store.start_turn()
+    store.add("search_rules", {"query": "trample"}, "old rules")
+    store.add("search_cards", {"query": "goblin"}, "cards")
+    store.start_turn()
+    store.add("search_rules", {"query": "trample"}, "new rules")
+    store.start_turn()
+
+    # the repeated call survives with the turn it was made again
+    assert len(store) == 1
+    assert store.to_text() == "search_rules(query='trample'):\nnew rules"
+
+
+def test_the_newest_evidence_fills_the_token_budget_first():
+    # every record is 3 tokens: "tool_n(input='q'):", "output" and "n"
+    store = EvidenceStore(max_turns=5, token_budget=TokenBudget(7))
+    store.start_turn()
+    for n in range(3):
+        store.add(f"tool_{n}", "q", f"output {n}")
+
+    assert tools(store) == ["tool_2", "tool_1"]
+    assert len(store) == 3
+
+
+def test_ignored_tools_and_empty_outputs_are_not_recorded():
+    store = EvidenceStore()
+    store.start_turn()
+    store.add("judge_report", {"report": "ruling"}, "sent")
+    store.add("user_deck_lookup", {}, "deck")
+    store.add("search_rules", {"query": "trample"}, "")
+
+    assert len(store) == 0
+
+
+def test_message_outputs_are_stored_as_their_content():
+    store = EvidenceStore()
+    store.start_turn()
+    store.add("search_rules", "trample", AIMessage(content="702.19a"))
+
+    assert store.to_text() == "search_rules(input='trample'):\n702.19a"
@@ -0,0 +1,43 @@
+import asyncio
+
+from mtg.agents import JudgeResearch
+from mtg.search import RulesIndex, RulesRouter
+from mtg.tools import CardNamesSearchTool, RulesSearchTool
+
+RULES = [
+    {"name": "702.19", "text": "Trample"},
+    {"name": "702.19a", "text": "Trample is a static ability."},
+    {"name": "510.1c", "text": "A blocked creature assigns its combat damage."},
+]
+
+
+def test_local_rules_searches_do_not_run_on_the_client_loop(tmp_path):
+    documents = [{**rule, "url": "", "metadata": {}} for rule in RULES]
+    index = RulesIndex.build(documents, tmp_path)
+    search = index.search
+    searched_on_loop = []
+
+    def recording_search(query: str, k: int = 10):
+        try:
+            asyncio.get_running_loop()
+            searched_on_loop.append(True)
+        except RuntimeError:
+            searched_on_loop.append(False)
+        return search(query, k=k)
+
+    index.search = recording_search
+    rules_tool = RulesSearchTool(
+        rules_index=index, rules_router=RulesRouter(index), search_mode="local"
+    )
+    research = JudgeResearch(CardNamesSearchTool(), rules_tool)
+
+    records = research.research("does trample work with a blocked creature?").result(
+        timeout=10
+    )
+
+    assert [tool_input for _, tool_input, _ in records] == [
+        {"query": "does trample work with a blocked creature?"},
+        {"query": "trample"},
+    ]
+    assert searched_on_loop == [False]
+    assert "Trample is a static ability." in records[1][2]
@@ -0,0 +1,92 @@
+import pytest
+from langchain.schema import AIMessage, HumanMessage
+
+import mtg.agents.memory
+from mtg.agents.memory import MESSAGE_OVERHEAD_TOKENS, TokenBufferMemory
+
+
+class WhitespaceEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class RecordingExecutor:
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, fn, *args):
+        self.calls.append((fn, args))
+
+
+@pytest.fixture(autouse=True)
+def encoding(monkeypatch):
+    monkeypatch.setattr(
+        mtg.agents.memory, "get_encoding", lambda name: WhitespaceEncoding()
+    )
+
+
+def save_turns(memory: TokenBufferMemory, turns: list[tuple[int, int]]):
+    for n_question_words, n_answer_words in turns:
+        memory.save_context(
+            {"human_input": " ".join(["question"] * n_question_words)},
+            {"output": " ".join(["answer"] * n_answer_words)},
+        )
+
+
+def message_tokens(n_words: int) -> int:
+    # the words, the role prefix and the message overhead
+    return n_words + 1 + MESSAGE_OVERHEAD_TOKENS
+
+
+def test_budget_boundary_in_a_turn_evicts_the_whole_turn():
+    # without the first question the buffer would fit
+    first_turn = message_tokens(20) + message_tokens(10)
+    memory = TokenBufferMemory(
+        max_token_limit=3 * first_turn - message_tokens(20), ai_prefix="Nissa"
+    )
+    save_turns(memory, [(20, 10), (20, 10)])
+    assert len(memory.chat_memory.messages) == 4
+
+    save_turns(memory, [(20, 10)])
+
+    messages = memory.chat_memory.messages
+    assert [type(message) for message in messages] == [
+        HumanMessage,
+        AIMessage,
+        HumanMessage,
+        AIMessage,
+    ]
+    assert memory.buffer_tokens == 2 * first_turn
+
+
+def test_summary_gets_whole_turns(monkeypatch):
+    executor = RecordingExecutor()
+    monkeypatch.setattr(mtg.agents.memory, "get_summary_executor", lambda: executor)
+    memory = TokenBufferMemory(
+        max_token_limit=message_tokens(10)
+        + message_tokens(20)
+        + message_tokens(10)
+        + 50,
+        summary_token_limit=50,
+        summary_model_name="gpt-4o-mini",
+        ai_prefix="Nissa",
+    )
+
+    save_turns(memory, [(20, 10), (20, 10)])
+
+    assert [type(message) for message in memory._pending] == [HumanMessage, AIMessage]
+    assert len(executor.calls) == 1
+
+
+def test_latest_turn_is_kept_over_the_budget():
+    memory = TokenBufferMemory(max_token_limit=10, ai_prefix="Nissa")
+
+    save_turns(memory, [(20, 10), (20, 10)])
+
+    assert [type(message) for message in memory.chat_memory.messages] == [
+        HumanMessage,
+        AIMessage,
+    ]
@@ -0,0 +1,85 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from mtg.nlp import card_matcher
+from mtg.nlp.card_matcher import (
+    CardNameMatcher,
+    compare_matcher_backends,
+    hash_card_names,
+    load_cached_spacy_model,
+    load_card_matcher,
+    load_spacy_model,
+)
+
+CORPUS_PATH = Path(__file__).parent.parent / "data" / "card_matcher_corpus.json"
+
+
+def test_loading_the_same_cards_shares_one_matcher():
+    cards = ["Ambush Viper", "Goblin Guide"]
+    n_matchers = len(card_matcher._SHARED_MATCHERS)
+
+    for _ in range(3):
+        nlp = load_spacy_model(cards, backend="automaton")
+
+    assert len(card_matcher._SHARED_MATCHERS) <= n_matchers + 1
+    assert nlp("attack with goblin guide")._.card_names == ["Goblin Guide"]
+
+
+def test_matches_with_the_same_pool_run_concurrently():
+    matcher = CardNameMatcher(backend="automaton")
+    cards = ["Ambush Viper", "Goblin Guide"]
+    matcher.sync(cards)
+
+    automaton = matcher.matcher
+    barrier = threading.Barrier(2, timeout=5)
+
+    def match_together(doc):
+        # both matches have to be inside the matcher at the same time
+        barrier.wait()
+        return automaton(doc)
+
+    matcher.matcher = match_together
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        docs = list(
+            executor.map(
+                lambda text: matcher.match(text, card_names=cards),
+                ["attack with goblin guide", "block with ambush viper"],
+            )
+        )
+
+    assert [doc._.card_names for doc in docs] == [["Goblin Guide"], ["Ambush Viper"]]
+    assert matcher.stats["cache_hits"] == 2
+
+
+def test_matcher_backends_agree_on_the_corpus():
+    with CORPUS_PATH.open("r", encoding="utf-8") as infile:
+        corpus = json.load(infile)
+
+    assert compare_matcher_backends(corpus["cards"], corpus["texts"]) == []
+
+
+def test_artifact_is_saved_and_loaded(tmp_path):
+    cards = ["Ambush Viper", "Goblin Guide"]
+    load_cached_spacy_model(cards, artifact_dir=tmp_path, backend="automaton")
+
+    card_hash = hash_card_names(cards, backend="automaton")
+    filepath = tmp_path / f"card_matcher_{card_hash}.pkl"
+    assert load_card_matcher(filepath, card_hash) is not None
+    nlp = load_cached_spacy_model(cards, artifact_dir=tmp_path, backend="automaton")
+    assert nlp("block with ambush viper")._.card_names == ["Ambush Viper"]
+
+
+def test_unwritable_artifact_dir_keeps_the_matcher_in_memory(tmp_path, monkeypatch):
+    def save_card_matcher(*args):
+        raise PermissionError("read-only file system")
+
+    monkeypatch.setattr(card_matcher, "save_card_matcher", save_card_matcher)
+
+    nlp = load_cached_spacy_model(
+        ["Goblin Guide"], artifact_dir=tmp_path, backend="automaton"
+    )
+
+    assert nlp("attack with goblin guide")._.card_names == ["Goblin Guide"]
+    assert list(tmp_path.iterdir()) == []
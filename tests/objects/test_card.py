@@ -0,0 +1,42 @@
+import pytest
+from pydantic import ValidationError
+
+from mtg.objects import Card
+
+CARD = {
+    "_id": "1",
+    "name": "Goblin Guide",
+    "mana_cost": "{R}",
+    "type": "Creature — Goblin Scout",
+    "oracle": "Haste",
+    "price": 1.5,
+    "url": "https://scryfall.com/goblin-guide",
+    "power": "2",
+    "toughness": "2",
+    "rulings": [{"name": "ruling", "text": "Guide ruling.", "url": ""}],
+}
+
+
+def test_from_trusted_builds_the_same_card_as_validation():
+    card = Card.from_trusted(CARD)
+
+    assert card == Card(**CARD)
+    assert card.to_text() == Card(**CARD).to_text()
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {**CARD, "price": None},
+        {**CARD, "power": None},
+        {key: value for key, value in CARD.items() if key != "price"},
+    ],
+)
+def test_from_trusted_validates_incomplete_cards(data):
+    with pytest.raises(ValidationError):
+        Card.from_trusted(data)
+
+
+def test_from_trusted_validates_rulings_of_none():
+    with pytest.raises(ValidationError):
+        Card.from_trusted({**CARD, "rulings": None})
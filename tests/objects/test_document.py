@@ -0,0 +1,28 @@
+import pytest
+from pydantic import ValidationError
+
+from mtg.objects import Document
+
+DOCUMENT = {
+    "name": "702.19b",
+    "text": "The controller of an attacking creature with trample first assigns damage.",
+    "url": "https://magic.wizards.com/rules",
+    "metadata": {"origin": "comprehensive rules"},
+}
+
+
+def test_from_trusted_builds_the_same_document_as_validation():
+    assert Document.from_trusted(DOCUMENT) == Document(**DOCUMENT)
+    assert Document.from_trusted({**DOCUMENT, "metadata": {}}).keywords == []
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {**DOCUMENT, "metadata": None},
+        {key: value for key, value in DOCUMENT.items() if key != "url"},
+    ],
+)
+def test_from_trusted_validates_incomplete_documents(data):
+    with pytest.raises(ValidationError):
+        Document.from_trusted(data)
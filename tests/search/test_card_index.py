@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from mtg.search.card_index import CardVectorIndex
+from mtg.search.card_store import CardStore
+
+CARDS = [
+    ("Goblin Guide", ["R"], ["Haste"], "legal", [1.0, 0.0, 0.0]),
+    ("Ambush Viper", ["G"], ["Flash", "Deathtouch"], "legal", [0.9, 0.1, 0.0]),
+    ("Boros Charm", ["R", "W"], [], "legal", [0.0, 1.0, 0.0]),
+    ("Sol Ring", [], [], "banned", [0.0, 0.0, 2.0]),
+]
+
+
+class QueryEmbeddings(Embeddings):
+    """embeds every query as the embedding of the card of the same name"""
+
+    def embed_query(self, text: str) -> list[float]:
+        return next(embedding for name, *_, embedding in CARDS if name == text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+@pytest.fixture
+def index(tmp_path) -> CardVectorIndex:
+    cards = [
+        {
+            "name": name,
+            "mana_cost": "",
+            "type": "",
+            "oracle": "",
+            "color_identity": color_identity,
+            "keywords": keywords,
+            "legalities": {"modern": legality, "vintage": "legal"},
+        }
+        for name, color_identity, keywords, legality, _ in CARDS
+    ]
+    store = CardStore.build(cards, tmp_path)
+    CardVectorIndex.build(store, [embedding for *_, embedding in CARDS])
+    return CardVectorIndex(store, QueryEmbeddings())
+
+
+def names(results: list[dict]) -> list[str]:
+    return [result["card"]["name"] for result in results]
+
+
+def test_top_k_is_ordered_by_distance(index):
+    results = index.search("Goblin Guide", k=2, threshold=2)
+
+    assert names(results) == ["Goblin Guide", "Ambush Viper"]
+    assert results[0]["distance"] == pytest.approx(0.0, abs=1e-6)
+    assert results[0]["distance"] < results[1]["distance"]
+
+
+def test_threshold_is_the_maximum_distance(index):
+    assert names(index.search("Goblin Guide", threshold=0.5)) == [
+        "Goblin Guide",
+        "Ambush Viper",
+    ]
+    assert names(index.search("Goblin Guide", threshold=1e-3)) == ["Goblin Guide"]
+
+
+def test_embeddings_are_normalized(index):
+    # sol ring has a longer embedding than the other cards
+    results = index.search("Sol Ring", k=1)
+
+    assert names(results) == ["Sol Ring"]
+    assert results[0]["distance"] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_color_identity_has_to_be_within_the_requested_colors(index):
+    red = index.search("Goblin Guide", color_identity=["R"], threshold=2)
+    boros = index.search("Goblin Guide", color_identity=["R", "W"], threshold=2)
+
+    assert names(red) == ["Goblin Guide", "Sol Ring"]
+    # boros charm and sol ring are equally far from goblin guide
+    assert set(names(boros)) == {"Goblin Guide", "Boros Charm", "Sol Ring"}
+
+
+def test_keywords_are_all_required(index):
+    deathtouch = index.search("Goblin Guide", keywords=["deathtouch"], threshold=2)
+
+    assert names(deathtouch) == ["Ambush Viper"]
+    assert index.search("Goblin Guide", keywords=["flash", "haste"], threshold=2) == []
+    assert index.search("Goblin Guide", keywords=["hexproof"], threshold=2) == []
+
+
+def test_legality(index):
+    modern = index.search("Sol Ring", legality="Modern", threshold=2)
+
+    assert "Sol Ring" not in names(modern)
+    assert len(modern) == 3
+    assert len(index.search("Sol Ring", legality="vintage", threshold=2)) == 4
+    assert index.search("Sol Ring", legality="pauper", threshold=2) == []
+
+
+def test_filters_combine(index):
+    results = index.search(
+        "Goblin Guide",
+        color_identity=["R", "G"],
+        keywords=["haste"],
+        legality="modern",
+        threshold=2,
+    )
+
+    assert names(results) == ["Goblin Guide"]
+
+
+def test_asearch(index):
+    results = asyncio.run(index.asearch("Boros Charm", k=1))
+
+    assert names(results) == ["Boros Charm"]
+
+
+def test_build_needs_an_embedding_for_every_card(tmp_path):
+    store = CardStore.build([{"name": "Sol Ring"}], tmp_path)
+
+    with pytest.raises(ValueError):
+        CardVectorIndex.build(store, [])
@@ -0,0 +1,32 @@
+from mtg.search.card_store import CardStore
+
+
+def card(name: str) -> dict:
+    return {
+        "name": name,
+        "mana_cost": "{1}{R}",
+        "type": "Legendary Creature",
+        "oracle": f"{name} oracle",
+        "price": 1.0,
+        "url": f"https://scryfall.com/{name}",
+        "rulings": [{"name": "ruling", "text": "shared ruling", "url": ""}],
+    }
+
+
+def test_full_names_take_priority_over_short_names(tmp_path):
+    cards = [card("Jaya Ballard, Task Mage"), card("Jaya Ballard"), card("Fire // Ice")]
+    store = CardStore.build(cards, tmp_path)
+
+    assert store.get("Jaya Ballard").name == "Jaya Ballard"
+    assert store.get("jaya ballard, task mage").name == "Jaya Ballard, Task Mage"
+    assert store.get("Ice").name == "Fire // Ice"
+    assert "Task Mage" not in store
+
+
+def test_rulings_are_stored_once(tmp_path):
+    store = CardStore.build([card("Goblin Guide"), card("Ambush Viper")], tmp_path)
+
+    assert [ruling.text for ruling in store.get("Ambush Viper").rulings] == [
+        "shared ruling"
+    ]
+    assert len(store._rulings) == 1
@@ -0,0 +1,95 @@
+import pytest
+
+from mtg.search.rules_index import RulesIndex, reciprocal_rank_fusion, tokenize
+
+RULES = [
+    (
+        "702.19a",
+        "Trample is a static ability that modifies the rules for assigning "
+        "an attacking creature's combat damage.",
+    ),
+    (
+        "702.2b",
+        "A creature with toughness greater than 0 that's been dealt damage by "
+        "a source with deathtouch is destroyed.",
+    ),
+    ("702.9a", "Flying is an evasion ability."),
+    ("510.1c", "A blocked creature assigns its combat damage to its blockers."),
+]
+
+
+def document(name: str, text: str) -> dict:
+    return {"name": name, "text": text, "url": "", "metadata": {}}
+
+
+def result(name: str, distance: float) -> dict:
+    return {"document": document(name, f"text of {name}"), "distance": distance}
+
+
+@pytest.fixture
+def index(tmp_path) -> RulesIndex:
+    return RulesIndex.build([document(*rule) for rule in RULES], tmp_path)
+
+
+def test_tokenize_keeps_rule_ids():
+    tokens = tokenize("See rule 702.19b, Trample!")
+
+    assert tokens == ["see", "rule", "702.19b", "trample"]
+
+
+def test_search_ranks_by_bm25(index):
+    names = [hit["document"]["name"] for hit in index.search("trample combat damage")]
+
+    # only 702.19a has all terms, 510.1c has combat damage, 702.2b only damage
+    assert names == ["702.19a", "510.1c", "702.2b"]
+
+
+def test_search_distances_are_ordered_between_0_and_1(index):
+    distances = [hit["distance"] for hit in index.search("creature damage")]
+
+    assert distances == sorted(distances)
+    assert all(0 < distance < 1 for distance in distances)
+
+
+def test_search_limits_results_and_skips_unknown_terms(index):
+    assert len(index.search("creature damage", k=1)) == 1
+    assert index.search("hexproof") == []
+
+
+def test_search_a_rule_id(index):
+    assert index.search("702.9a")[0]["document"]["name"] == "702.9a"
+
+
+def test_reopened_index_returns_the_same_documents(index, tmp_path):
+    reopened = RulesIndex(tmp_path)
+
+    assert len(reopened) == len(RULES)
+    assert reopened.document(2) == document(*RULES[2])
+
+
+def test_empty_index(tmp_path):
+    index = RulesIndex.build([], tmp_path)
+
+    assert len(index) == 0
+    assert index.search("trample") == []
+
+
+def test_rrf_ranks_documents_found_by_both_searches_first():
+    vector = [result("a", 0.1), result("b", 0.2), result("c", 0.3)]
+    bm25 = [result("c", 0.4), result("d", 0.5), result("a", 0.6)]
+
+    merged = reciprocal_rank_fusion([vector, bm25], k=60)
+
+    # a: 1/61 + 1/63, c: 1/63 + 1/61, then b and d with one rank 2 hit each
+    assert [hit["document"]["name"] for hit in merged][:2] in (["a", "c"], ["c", "a"])
+    assert {hit["document"]["name"] for hit in merged[2:]} == {"b", "d"}
+    assert merged[0]["distance"] == pytest.approx(1 - (1 / 61 + 1 / 63) / (2 / 61))
+
+
+def test_rrf_sorts_each_response_by_distance_and_limits():
+    vector = [result("b", 0.9), result("a", 0.1)]
+
+    merged = reciprocal_rank_fusion([vector], limit=1)
+
+    assert [hit["document"]["name"] for hit in merged] == ["a"]
+    assert merged[0]["distance"] == pytest.approx(0.0)
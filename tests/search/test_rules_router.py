@@ -0,0 +1,100 @@
+import pytest
+
+from mtg.search.rules_index import RulesIndex
+from mtg.search.rules_router import RulesRouter
+
+RULES = [
+    ("510.1c", "A blocked creature assigns its combat damage to its blockers."),
+    ("702.2", "Deathtouch"),
+    ("702.2a", "Deathtouch is a static ability."),
+    ("702.2b", "A creature dealt damage by deathtouch is destroyed. (See 704.5h.)"),
+    ("702.4a", "Double strike is a static ability."),
+    ("702.19", "Trample"),
+    ("702.19a", "Trample is a static ability."),
+    ("702.19b", "Assign lethal damage to all blockers first. (See rule 510.1c.)"),
+    ("702.19c", "Trample over planeswalkers."),
+    ("702.19d", "Trample with double strike."),
+    ("704.5h", "A creature dealt deathtouch damage is destroyed. See rule 510.1c."),
+]
+
+
+@pytest.fixture
+def router(tmp_path) -> RulesRouter:
+    documents = [
+        {"name": name, "text": text, "url": "", "metadata": {}} for name, text in RULES
+    ]
+    return RulesRouter(RulesIndex.build(documents, tmp_path))
+
+
+def routed(router: RulesRouter, query: str):
+    response = router.route(query)
+    if response is None:
+        return None
+    return [result["document"]["name"] for result in response]
+
+
+def test_rule_id(router):
+    assert routed(router, "702.19b") == ["702.19b"]
+    assert routed(router, "rule 702.19c.") == ["702.19c"]
+
+
+def test_whole_rule_with_its_subrules(router):
+    assert routed(router, "702.2") == ["702.2", "702.2a", "702.2b"]
+
+
+def test_ranges(router):
+    assert routed(router, "702.19a-c") == ["702.19a", "702.19b", "702.19c"]
+    assert routed(router, "702.19b to 702.19d") == ["702.19b", "702.19c", "702.19d"]
+
+
+def test_keywords(router):
+    assert routed(router, "trample") == [
+        "702.19",
+        "702.19a",
+        "702.19b",
+        "702.19c",
+        "702.19d",
+    ]
+    assert routed(router, "keyword double strike") == ["702.4a"]
+
+
+def test_several_parts(router):
+    assert routed(router, "702.19a, 704.5h and deathtouch") == [
+        "702.19a",
+        "704.5h",
+        "702.2",
+        "702.2a",
+        "702.2b",
+    ]
+
+
+def test_unknown_rule_ids_and_free_text_are_not_routed(router):
+    assert routed(router, "999.1a") is None
+    assert routed(router, "does trample work with deathtouch?") is None
+    # one free text part sends the whole query to the semantic search
+    assert routed(router, "702.19a and how does it work") is None
+
+
+def test_match_keywords_prefers_the_longest_name(router):
+    keywords = router.match_keywords("Does double strike with trample use deathtouch?")
+
+    assert keywords == ["double strike", "trample", "deathtouch"]
+
+
+def test_referenced_rules_by_depth(router):
+    assert router.referenced_rules(["702.2b"], depth=0) == []
+    assert router.referenced_rules(["702.2b"], depth=1) == ["704.5h"]
+    assert router.referenced_rules(["702.2b"], depth=2) == ["704.5h", "510.1c"]
+
+
+def test_referenced_rules_skip_the_given_and_seen_rules(router):
+    references = router.referenced_rules(["702.19b", "704.5h", "510.1c"], depth=3)
+
+    assert references == []
+
+
+def test_rule_map_is_reused(router, tmp_path):
+    router.route("trample")
+
+    assert (tmp_path / "rule_map.json").exists()
+    assert RulesRouter(RulesIndex(tmp_path)).get("704.5h")["name"] == "704.5h"
@@ -0,0 +1,103 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import mtg.tools.card_prefetch
+import mtg.tools.card_search_tool
+import mtg.utils.response_cache
+from mtg.search import CardStore
+from mtg.tools.card_prefetch import CardPrefetcher
+from mtg.tools.card_search_tool import CardNameSearchTool
+from mtg.utils.response_cache import ResponseCache
+
+
+def matcher(card_names: list[str]):
+    """stands in for the spacy pipeline, matches the given card names"""
+    return lambda text: SimpleNamespace(_=SimpleNamespace(card_names=card_names))
+
+
+def card(name: str) -> dict:
+    return {"name": name, "mana_cost": "", "type": "", "oracle": ""}
+
+
+@pytest.fixture
+def cache(monkeypatch) -> ResponseCache:
+    cache = ResponseCache()
+    monkeypatch.setattr(mtg.utils.response_cache, "_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def fetched(monkeypatch) -> list[str]:
+    fetched = []
+
+    async def send_get_request(url, key=None):
+        fetched.append(url)
+        card_name = url.rsplit("/", 1)[-1]
+        if card_name == "Unknown Card":
+            raise ValueError("card not found")
+        return {"card": card(card_name), "distance": 0.0}
+
+    monkeypatch.setattr(mtg.tools.card_prefetch, "send_get_request", send_get_request)
+    monkeypatch.setattr(
+        mtg.tools.card_search_tool, "send_get_request", send_get_request
+    )
+    return fetched
+
+
+@pytest.fixture
+def tool(tmp_path) -> CardNameSearchTool:
+    store = CardStore.build([card("Sol Ring")], tmp_path)
+    return CardNameSearchTool(url="http://dataservice/", card_store=store)
+
+
+def test_cached_and_local_cards_are_not_fetched(cache, fetched, tool):
+    tool_key = tool._card_name_cache_key("Black Lotus")
+    cache.set(tool_key, {"card": card("Black Lotus"), "distance": 0.0})
+    prefetcher = CardPrefetcher(
+        tool, matcher(["Sol Ring", "Black Lotus", "Goblin Guide"])
+    )
+
+    prefetched = asyncio.run(prefetcher.aprefetch("sol ring, lotus or goblin guide?"))
+
+    assert prefetched == ["Goblin Guide"]
+    assert fetched == ["http://dataservice/card_name/Goblin Guide"]
+    assert tool._card_name_cache_key("Goblin Guide") in cache
+
+
+def test_lookups_of_prefetched_cards_hit_the_cache(cache, fetched, tool):
+    prefetcher = CardPrefetcher(tool, matcher(["Goblin Guide", "Ambush Viper"]))
+    asyncio.run(prefetcher.aprefetch("goblin guide or ambush viper?"))
+
+    response = asyncio.run(tool._aresolve("goblin guide"))
+
+    assert response["card"]["name"] == "Goblin Guide"
+    assert len(fetched) == 2
+    assert prefetcher.stats() == {"prefetched": 2, "hits": 1, "hit_rate": 0.5}
+
+    # a second prefetch of the same query fetches nothing
+    assert asyncio.run(prefetcher.aprefetch("goblin guide or ambush viper?")) == []
+    assert len(fetched) == 2
+
+
+def test_failed_prefetches_are_untagged_and_not_cached(cache, fetched, tool):
+    prefetcher = CardPrefetcher(tool, matcher(["Unknown Card"]))
+
+    assert asyncio.run(prefetcher.aprefetch("unknown card?")) == ["Unknown Card"]
+
+    key = tool._card_name_cache_key("Unknown Card")
+    assert key not in cache
+    cache.get(key)
+    assert prefetcher.stats()["hits"] == 0
+
+
+def test_max_cards(cache, fetched, tool):
+    prefetcher = CardPrefetcher(
+        tool, matcher(["Goblin Guide", "Ambush Viper", "Boros Charm"]), max_cards=2
+    )
+
+    assert asyncio.run(prefetcher.aprefetch("three cards")) == [
+        "Goblin Guide",
+        "Ambush Viper",
+    ]
@@ -0,0 +1,39 @@
+from mtg.search import RulesIndex, RulesRouter
+from mtg.tools import RulesSearchTool
+
+RULES = [
+    {
+        "name": "702.2b",
+        "text": "A creature with toughness greater than 0 that's been dealt damage "
+        "by a source with deathtouch is destroyed. (See rule 704.5h.)",
+    },
+    {
+        "name": "704.5h",
+        "text": "If a creature has been dealt damage by a source with deathtouch, "
+        "that creature is destroyed.",
+    },
+]
+
+
+def result(name: str, text: str, origin: str, distance: float) -> dict:
+    document = {"name": name, "text": text, "url": "", "metadata": {"origin": origin}}
+    return {"document": document, "distance": distance}
+
+
+def test_references_of_all_origins_are_attached(tmp_path):
+    documents = [{**rule, "url": "", "metadata": {}} for rule in RULES]
+    tool = RulesSearchTool(
+        rules_router=RulesRouter(RulesIndex.build(documents, tmp_path)),
+        reference_depth=1,
+    )
+    response = [
+        result("deathtouch", "Deathtouch kills any creature.", "rulesguru", 0.1),
+        result("702.2b", RULES[0]["text"], "comprehensive rules", 0.2),
+        result("trample", "Deathtouch with trample.", "stackexchange", 0.3),
+    ]
+
+    rule_texts = tool._parse_response(response)
+
+    for origin in ("rulesguru", "comprehensive rules", "stackexchange"):
+        assert f"{origin}:\n" in rule_texts
+    assert "Referenced Rules:\n704.5h - " in rule_texts
@@ -0,0 +1,105 @@
+import pytest
+
+from mtg.nlp.card_matcher import load_spacy_model
+from mtg.search import RulesIndex, RulesRouter
+from mtg.utils.answer_cache import AnswerCache, answer_context, key_terms
+from tests.bot.test_qa import TEST_CASES_KEYWORDS
+
+KEYWORD_RULES = {
+    "702.2": "Deathtouch",
+    "702.4": "Double Strike",
+    "702.7": "First Strike",
+    "702.9": "Flying",
+    "702.15": "Lifelink",
+    "702.19": "Trample",
+}
+CARDS = ["Ambush Viper", "Goblin Striker", "Goblin Guide"]
+
+NEAR_MISSES = [
+    (TEST_CASES_KEYWORDS[3], TEST_CASES_KEYWORDS[4]),
+    (TEST_CASES_KEYWORDS[3], TEST_CASES_KEYWORDS[5]),
+    (
+        "what happens if my 3/3 with trample is blocked by a 1/1?",
+        "what happens if my 3/3 with flying is blocked by a 1/1?",
+    ),
+    (
+        "does a creature with first strike deal damage twice?",
+        "does a creature with double strike deal damage twice?",
+    ),
+    (
+        "what happens if my creature with deathtouch deals damage to a player?",
+        "what happens if my creature with lifelink deals damage to a player?",
+    ),
+    (
+        "can i attack with Ambush Viper into a Goblin Striker?",
+        "can i attack with Ambush Viper into a Goblin Guide?",
+    ),
+]
+
+
+@pytest.fixture(scope="module")
+def rules_router(tmp_path_factory) -> RulesRouter:
+    documents = [
+        {"name": rule_id, "text": text, "url": "", "metadata": {}, "keywords": []}
+        for rule_id, text in KEYWORD_RULES.items()
+    ]
+    return RulesRouter(RulesIndex.build(documents, tmp_path_factory.mktemp("rules")))
+
+
+@pytest.fixture(scope="module")
+def nlp():
+    return load_spacy_model(CARDS, backend="automaton")
+
+
+@pytest.fixture
+def context(rules_router, nlp):
+    def context(query: str):
+        return answer_context(
+            query,
+            card_names=nlp(query)._.card_names,
+            keywords=rules_router.match_keywords(query),
+            decks={},
+            model_name="gpt-4o",
+        )
+
+    return context
+
+
+def test_key_terms_keep_power_and_toughness_in_order():
+    assert key_terms("a 5/5 blocked by a 1/1") == ("5/5", "1/1")
+    assert key_terms("a 1/1 blocked by a 5/5") == ("1/1", "5/5")
+    assert key_terms("a 5/5 blocked by a 5/1") == ("5/5", "5/1")
+    assert key_terms("can't i put a +1/+1 counter on it?") == ("cant", "+1/+1")
+
+
+@pytest.mark.parametrize("cached_query,query", NEAR_MISSES)
+def test_near_miss_queries_are_not_answered(context, cached_query, query):
+    cache = AnswerCache()
+    cache.set(context(cached_query), cached_query, "cached answer")
+
+    assert cache.get(context(query), query) is None
+    assert cache.get(context(cached_query), cached_query) == "cached answer"
+
+
+def test_similar_query_is_answered(context):
+    cache = AnswerCache()
+    cache.set(context(TEST_CASES_KEYWORDS[3]), TEST_CASES_KEYWORDS[3], "answer")
+
+    query = TEST_CASES_KEYWORDS[3].replace("what happens", "What happen")
+    assert cache.get(context(query), query) == "answer"
+    assert cache.stats()["similar_hits"] == 1
+
+
+def test_similar_query_is_not_answered_without_recognition():
+    def context(query: str):
+        return answer_context(
+            query, card_names=[], keywords=[], decks={}, model_name="gpt-4o"
+        )
+
+    cache = AnswerCache()
+    cache.set(context(TEST_CASES_KEYWORDS[3]), TEST_CASES_KEYWORDS[3], "answer")
+
+    query = TEST_CASES_KEYWORDS[3].replace("what happens", "What happen")
+    assert cache.get(context(query), query, similar=False) is None
+    query = TEST_CASES_KEYWORDS[3].upper()
+    assert cache.get(context(query), query, similar=False) == "answer"
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from mtg.utils.dataservice_client import DataserviceClient
+
+
+class Dataservice:
+    """local http server whose responses wait until they are released"""
+
+    def __init__(self):
+        self.hits = 0
+        self.released = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    async def _wait(self):
+        self.hits += 1
+        while not self.released.is_set():
+            await asyncio.sleep(0.01)
+
+    async def cards(self, request: web.Request) -> web.Response:
+        await self._wait()
+        return web.json_response({"hits": self.hits})
+
+    async def error(self, request: web.Request) -> web.Response:
+        await self._wait()
+        raise web.HTTPInternalServerError()
+
+    async def _start(self) -> int:
+        app = web.Application()
+        app.router.add_post("/cards", self.cards)
+        app.router.add_post("/error", self.error)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    def start(self) -> str:
+        self._thread.start()
+        port = asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return f"http://127.0.0.1:{port}/"
+
+    def stop(self):
+        self.released.set()
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+@pytest.fixture
+def dataservice():
+    dataservice = Dataservice()
+    dataservice.url = dataservice.start()
+    yield dataservice
+    dataservice.stop()
+
+
+@pytest.fixture
+def client():
+    client = DataserviceClient(timeout=5)
+    yield client
+    client.close()
+
+
+async def wait_for_hits(dataservice: Dataservice, hits: int = 1):
+    while dataservice.hits < hits:
+        await asyncio.sleep(0.01)
+
+
+def test_identical_requests_are_merged(dataservice, client):
+    async def main():
+        callers = [
+            asyncio.ensure_future(
+                client.post(f"{dataservice.url}cards", {"name": "Goblin Guide"})
+            )
+            for _ in range(3)
+        ]
+        await wait_for_hits(dataservice)
+        dataservice.released.set()
+        return await asyncio.gather(*callers)
+
+    assert asyncio.run(main()) == [{"hits": 1}] * 3
+    assert dataservice.hits == 1
+    assert client.stats()["merged"] == 2
+    assert client.stats()["requests"] == 1
+
+
+def test_errors_reach_every_caller(dataservice, client):
+    async def main():
+        callers = [
+            asyncio.ensure_future(client.post(f"{dataservice.url}error", {}))
+            for _ in range(3)
+        ]
+        await wait_for_hits(dataservice)
+        dataservice.released.set()
+        return await asyncio.gather(*callers, return_exceptions=True)
+
+    errors = asyncio.run(main())
+
+    assert all(isinstance(error, aiohttp.ClientResponseError) for error in errors)
+    assert dataservice.hits == 1
+    assert client.stats()["errors"] == 1
+
+
+def test_cancelled_caller_does_not_cancel_the_others(dataservice, client):
+    async def main():
+        cancelled = asyncio.ensure_future(client.post(f"{dataservice.url}cards", {}))
+        waiting = asyncio.ensure_future(client.post(f"{dataservice.url}cards", {}))
+        await wait_for_hits(dataservice)
+        cancelled.cancel()
+        await asyncio.sleep(0.05)
+        dataservice.released.set()
+        return await asyncio.gather(cancelled, waiting, return_exceptions=True)
+
+    cancelled, response = asyncio.run(main())
+
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert response == {"hits": 1}
+    assert client.stats()["errors"] == 0
+
+
+def test_request_is_cancelled_with_its_last_caller(dataservice, client):
+    async def main():
+        callers = [
+            asyncio.ensure_future(client.post(f"{dataservice.url}cards", {}))
+            for _ in range(2)
+        ]
+        await wait_for_hits(dataservice)
+        for caller in callers:
+            caller.cancel()
+        return await asyncio.gather(*callers, return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    deadline = time.monotonic() + 5
+    while client.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.stats()["in_flight"] == 0
+    assert client.stats()["in_flight_keys"] == 0
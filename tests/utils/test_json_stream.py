@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import pytest
+
+from mtg.utils.json_stream import JsonArrayParser, iter_json_array
+
+ELEMENTS = [
+    {"name": "Jaya Ballard, Task Mage", "text": 'say "hi", then ] and [ \\ done'},
+    {"name": "Lim-Dûl's Vault", "cost": 12, "price": 0.25},
+    'a string with \\"escapes\\" and é\n',
+    [1, -2.5e3, True, False, None],
+    1234,
+]
+DATA = json.dumps(ELEMENTS, ensure_ascii=False).encode("utf-8")
+
+
+def parse_chunks(chunks: list[bytes]) -> list:
+    parser = JsonArrayParser()
+    elements = []
+    for chunk in chunks:
+        elements += parser.feed(chunk)
+    return elements + parser.feed(b"", final=True)
+
+
+@pytest.mark.parametrize("split", range(1, len(DATA)))
+def test_every_split_point(split):
+    assert parse_chunks([DATA[:split], DATA[split:]]) == ELEMENTS
+
+
+def test_byte_by_byte():
+    chunks = [DATA[i : i + 1] for i in range(len(DATA))]
+
+    assert parse_chunks(chunks) == ELEMENTS
+
+
+def test_elements_are_returned_as_soon_as_they_are_complete():
+    parser = JsonArrayParser()
+
+    assert parser.feed(b'[{"name": "Sol Ring"}, {"na') == [{"name": "Sol Ring"}]
+    assert parser.feed(b'me": "Mox"}, 12') == [{"name": "Mox"}]
+    # the number could go on in the next chunk
+    assert parser.feed(b"3 ") == [123]
+    assert parser.feed(b"]", final=True) == []
+
+
+def test_empty_array_and_whitespace():
+    assert parse_chunks([b" \n[ ", b" ]\n"]) == []
+
+
+def test_not_an_array():
+    with pytest.raises(ValueError):
+        JsonArrayParser().feed(b'{"name": "Sol Ring"}')
+
+
+def test_truncated_array():
+    with pytest.raises(ValueError):
+        parse_chunks([DATA[:-1]])
+
+
+def test_iter_json_array():
+    async def chunks():
+        for i in range(0, len(DATA), 7):
+            yield DATA[i : i + 7]
+
+    async def collect():
+        return [element async for element in iter_json_array(chunks())]
+
+    assert asyncio.run(collect()) == ELEMENTS
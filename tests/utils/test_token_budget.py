@@ -0,0 +1,85 @@
+import pytest
+
+import mtg.utils.token_budget
+from mtg.utils.token_budget import TokenBudget
+
+
+class WhitespaceEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def encoding(monkeypatch):
+    monkeypatch.setattr(
+        mtg.utils.token_budget, "get_encoding", lambda name: WhitespaceEncoding()
+    )
+
+
+def card(name: str) -> list[str]:
+    # 10, 6 and 4 tokens: with rulings, without rulings, without rulings and price
+    text = f"{name} text text text"
+    price = "price price"
+    rulings = "ruling ruling ruling ruling"
+    return [f"{text} {price} {rulings}", f"{text} {price}", text]
+
+
+def levels(packed: list[str], records: list[list[str]]) -> list[int]:
+    return [variants.index(text) for text, variants in zip(packed, records)]
+
+
+@pytest.fixture
+def records() -> list[list[str]]:
+    return [card("first"), card("second"), card("third")]
+
+
+def test_everything_fits(records):
+    packed = TokenBudget(30).pack(records)
+
+    assert levels(packed, records) == [0, 0, 0]
+
+
+def test_rulings_are_dropped_from_the_lowest_ranked_record_first(records):
+    packed = TokenBudget(26).pack(records)
+
+    assert levels(packed, records) == [0, 0, 1]
+
+
+def test_rulings_are_dropped_from_all_records_before_any_price(records):
+    packed = TokenBudget(18).pack(records)
+
+    assert levels(packed, records) == [1, 1, 1]
+
+    packed = TokenBudget(16).pack(records)
+
+    assert levels(packed, records) == [1, 1, 2]
+
+
+def test_whole_records_are_dropped_after_all_are_trimmed(records):
+    packed = TokenBudget(12).pack(records)
+
+    assert levels(packed, records) == [2, 2, 2]
+
+    packed = TokenBudget(8).pack(records)
+
+    assert levels(packed, records) == [2, 2]
+
+
+def test_the_first_record_is_always_kept(records):
+    packed = TokenBudget(1).pack(records)
+
+    assert packed == [records[0][2]]
+
+
+def test_stats_add_up_over_calls(records):
+    budget = TokenBudget(8)
+    budget.pack(records)
+    budget.pack(records[:1])
+
+    assert budget.stats() == {
+        "calls": 2,
+        "packed_tokens": 8 + 6,
+        "dropped_tokens": (30 - 8) + (10 - 6),
+        "trimmed_records": 3,
+        "dropped_records": 1,
+    }
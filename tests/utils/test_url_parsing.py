@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from mtg.nlp.card_matcher import load_spacy_model
+from mtg.utils.url_parsing import (
+    CardUrlIndex,
+    LocalCardLinker,
+    StreamingCardLinker,
+    alink_card_names,
+    card_name_keys,
+)
+
+CARD_URLS = {
+    "Jaya Ballard, Task Mage": "https://scryfall.com/task-mage",
+    "Jaya Ballard": "https://scryfall.com/jaya",
+    "Fire // Ice": "https://scryfall.com/fire-ice",
+}
+
+
+def test_card_name_keys():
+    assert card_name_keys("Jaya Ballard, Task Mage") == [
+        "jaya ballard, task mage",
+        "jaya ballard",
+    ]
+    assert card_name_keys("Fire // Ice") == ["fire // ice", "fire", "ice"]
+
+
+def test_full_names_take_priority_over_short_names():
+    index = CardUrlIndex(CARD_URLS)
+
+    assert index.get("Jaya Ballard") == "https://scryfall.com/jaya"
+    assert index.get("jaya ballard, task mage") == "https://scryfall.com/task-mage"
+    assert index.get("Ice") == "https://scryfall.com/fire-ice"
+
+
+@pytest.fixture(scope="module")
+def local_linker() -> LocalCardLinker:
+    card_urls = {
+        **CARD_URLS,
+        "Goblin Guide": "https://scryfall.com/goblin-guide",
+        "Ambush Viper": "https://scryfall.com/ambush-viper",
+        "Chatterfang, Squirrel General": "https://scryfall.com/chatterfang",
+    }
+    nlp = load_spacy_model(list(card_urls), backend="automaton")
+    return LocalCardLinker(CardUrlIndex(card_urls), nlp=nlp)
+
+
+def stream_link(linker: StreamingCardLinker, text: str, chunk_size: int) -> str:
+    async def stream():
+        for start in range(0, len(text), chunk_size):
+            yield text[start : start + chunk_size]
+
+    async def link():
+        return [segment async for segment in alink_card_names(stream(), linker)]
+
+    return "".join(asyncio.run(link()))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 8])
+def test_streaming_links_like_the_whole_text(local_linker, chunk_size):
+    text = (
+        "I attack with Goblin Guide and Chatterfang, Squirrel General, "
+        "my opponent blocks with <<Ambush Viper>> and Jaya Ballard."
+    )
+    linker = StreamingCardLinker.from_local_linker(local_linker, link_unmarked=True)
+
+    linked_text = stream_link(linker, text, chunk_size)
+
+    assert linked_text == local_linker(text)
+    assert "[Goblin Guide](https://scryfall.com/goblin-guide)" in linked_text
+    assert "[Jaya Ballard](https://scryfall.com/jaya)" in linked_text
+
+
+def test_streaming_links_markers_of_every_segment():
+    requests = []
+
+    def link(text: str) -> str:
+        requests.append(text)
+        return text.replace("<<", "[").replace(">>", "]")
+
+    text = "Play <<Goblin Guide>> first, then <<Ambush Viper>>."
+    linked_text = stream_link(StreamingCardLinker(link, holdback_words=0), text, 4)
+
+    assert linked_text == "Play [Goblin Guide] first, then [Ambush Viper]."
+    assert all("<<" in request for request in requests)